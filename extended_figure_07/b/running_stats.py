@@ -0,0 +1,101 @@
+import numpy as np
+
+
+def _pad_frames(x, n_frames):
+    """
+    Pad an array of shape (frames, ...) with zeros to n_frames frames.
+    """
+    if len(x) >= n_frames:
+        return x
+    return np.concatenate([x, np.zeros((n_frames - len(x), *x.shape[1:]), dtype=x.dtype)])
+
+
+def _as_block(x):
+    """
+    One seed of shape (n_frames,) or a block of seeds of shape (n_seeds, n_frames) as a 2-D float array.
+    """
+    return np.atleast_2d(np.asarray(x, dtype=np.float64))
+
+
+class RunningStats:
+    """
+    Per-timestep count, mean and variance of an ensemble, updated one seed at a time.
+
+    The mean and the sum of squared deviations of each timestep are updated with Welford's algorithm,
+    in the pairwise form of Chan et al. for a block of seeds or for merge(). Only a few arrays of shape
+    (n_frames,) are kept, so the memory in use does not grow with the number of seeds. NaN values, e.g.
+    the frames after the end of a shorter trajectory, are not counted, and the arrays grow when a longer
+    trajectory is added.
+
+    Attributes:
+    count (numpy.ndarray): Number of values at each timestep.
+    """
+
+    def __init__(self):
+        self.count = np.zeros(0, dtype=np.int64)
+        self._mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+
+    def __len__(self):
+        return len(self.count)
+
+    def _combine(self, count, mean, m2):
+        n_frames = max(len(self.count), len(count))
+        self.count, self._mean, self._m2 = (_pad_frames(x, n_frames) for x in (self.count, self._mean, self._m2))
+        count, mean, m2 = (_pad_frames(x, n_frames) for x in (count, mean, m2))
+
+        total = self.count + count
+        weight = count / np.maximum(total, 1)
+        delta = mean - self._mean
+        self._mean = self._mean + delta * weight
+        self._m2 = self._m2 + m2 + delta**2 * self.count * weight
+        self.count = total
+
+    def update(self, x):
+        """
+        Add one seed or a block of seeds.
+
+        Parameters:
+        x (array-like): Values of shape (n_frames,) for one seed, or (n_seeds, n_frames) for a block, e.g. a row
+            or a slice of CVEnsemble.cv(). NaN values are skipped.
+
+        Returns:
+        RunningStats: self.
+        """
+        x = _as_block(x)
+        valid = ~np.isnan(x)
+        count = valid.sum(axis=0)
+        mean = np.where(valid, x, 0.0).sum(axis=0) / np.maximum(count, 1)
+        m2 = (np.where(valid, x - mean, 0.0)**2).sum(axis=0)
+        self._combine(count, mean, m2)
+        return self
+
+    def merge(self, other):
+        """
+        Add the seeds of another accumulator, e.g. of another case or worker.
+
+        Returns:
+        RunningStats: self.
+        """
+        self._combine(other.count, other._mean, other._m2)
+        return self
+
+    @property
+    def mean(self):
+        """
+        Mean at each timestep, NaN at timesteps without values.
+        """
+        return np.where(self.count > 0, self._mean, np.nan)
+
+    def var(self, ddof=0):
+        """
+        Variance at each timestep, as numpy.var() over the seeds. NaN at timesteps with count <= ddof.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.count > ddof, self._m2 / (self.count - ddof), np.nan)
+
+    def std(self, ddof=0):
+        """
+        Standard deviation at each timestep, as numpy.std() over the seeds.
+        """
+        return np.sqrt(self.var(ddof))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+from pathlib import Path
+
+from dcd_reader import ARCHIVE_SUFFIX, dcd_files, open_dcd, write_archive
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Write a trajectory to a compressed archive of quantized coordinates")
+    parser.add_argument("--dcd", type=str, required=True, help="DCD file for trajectory, or a frame index of several DCD files written by step00_index_trajectory.py")
+    parser.add_argument("--out", type=str, required=True, help=f"Output archive file name ({ARCHIVE_SUFFIX})")
+    parser.add_argument("--precision", type=float, default=0.01, help="Quantization step of the coordinates in Angstrom")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Number of frames per chunk, the smallest unit decoded by a read")
+    parser.add_argument("--compression-level", type=int, default=6, help="Deflate level from 1 (fastest) to 9 (smallest)")
+    return parser
+
+
+def run(args, topologies=None):
+    """
+    Archive one trajectory.
+    The archive is given as --dcd to the step01 scripts in place of the DCD file.
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    topologies (dict, optional): Unused, accepted for step01_batch.py.
+    """
+    if Path(args.out).suffix != ARCHIVE_SUFFIX:
+        raise ValueError(f"{args.out} must have the {ARCHIVE_SUFFIX} suffix to be recognized as an archive.")
+
+    reader = open_dcd(args.dcd)
+    size = write_archive(reader, args.out, args.precision, args.chunk_size, args.compression_level)
+    source = sum(os.path.getsize(filename) for filename in dcd_files(args.dcd))
+    print(f"{args.out}: {reader.n_frames} frames, {size / 1024**2:.1f} MB ({size / source:.1%} of the DCD)")
+
+
+def main():
+    args = get_parser().parse_args()
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 import argparse
-import pathlib
 import warnings
 
 warnings.filterwarnings("ignore")
@@ -12,29 +11,28 @@ import matplotlib.cm as cm
 
 import numpy as np
 import pandas as pd
-from pathlib import Path
 from color_config import Color
+from cv_ensemble import iter_cv
+from running_stats import RunningStats
 
 plt.rcParams.update({'font.size': 25})
 
-def plot_mean_and_std_two_groups(df_list1, df_list2, save_path=None):
+def plot_mean_and_std_two_groups(data1, data2, save_path=None):
     """
-    df_list1, df_list2: List of pandas Series or single-column DataFrames
+    data1, data2: RunningStats of load_stalk_rmsd(), or array of shape (num_samples, num_timesteps)
         2つの異なる条件のデータセットを比較プロットする
     save_path: str or Path, optional
         プロット画像の保存先パス。Noneなら保存せず表示だけする。
     """
     colors = Color()
 
-    def get_mean_std(df_list):
-        arrays = [df.values.flatten() for df in df_list]
-        data = np.vstack(arrays)
-        mean = np.mean(data, axis=0)
-        std = np.std(data, axis=0)
-        return mean, std
+    def get_mean_std(data):
+        # load_stalk_rmsd()のRunningStatsはそのまま、配列はseedの行をまとめて集計する
+        stats = data if isinstance(data, RunningStats) else RunningStats().update(data)
+        return stats.mean, stats.std()
 
-    mean1, std1 = get_mean_std(df_list1)
-    mean2, std2 = get_mean_std(df_list2)
+    mean1, std1 = get_mean_std(data1)
+    mean2, std2 = get_mean_std(data2)
     timesteps = np.arange(len(mean1))
 
     plt.figure(figsize=(10, 6))
@@ -63,22 +61,19 @@ def plot_mean_and_std_two_groups(df_list1, df_list2, save_path=None):
         plt.show()
 
 
-def plot_mean_and_std(df_list, save_path=None):
+def plot_mean_and_std(data, save_path=None):
 
     """
-    df_list: List of pandas Series or single-column DataFrames
+    data: RunningStats of load_stalk_rmsd(), or array of shape (num_samples, num_timesteps)
     save_path: str or Path, optional
         プロット画像の保存先パス。Noneなら保存せず表示だけする。
 
     各時刻における値の平均と標準偏差を計算し、プロットする
     """
-    # 全データをnumpy配列に変換
-    arrays = [df.values.flatten() for df in df_list]
-    data = np.vstack(arrays)  # shape: (num_samples, num_timesteps)
-
-    # 平均と標準偏差を計算
-    mean = np.mean(data, axis=0)
-    std = np.std(data, axis=0)
+    # 平均と標準偏差を計算（配列はseedの行をまとめて集計する）
+    stats = data if isinstance(data, RunningStats) else RunningStats().update(data)
+    mean = stats.mean
+    std = stats.std()
 
     # 時間軸
     timesteps = np.arange(len(mean))
@@ -109,28 +104,26 @@ def plot_mean_and_std(df_list, save_path=None):
     return mean, std
 
 def save_mean_std_two_groups(
-    df_list1, df_list2, output_csv_path,
+    data1, data2, output_csv_path,
     list1_name="Group1", list2_name="Group2"
 ):
     """
     2つの条件のデータセットに対して時間ステップごとの平均・標準偏差を計算し、CSVに保存する。
 
     Parameters:
-        df_list1 (list of pd.Series or pd.DataFrame): 条件1のデータ（縦に積む）
-        df_list2 (list of pd.Series or pd.DataFrame): 条件2のデータ（縦に積む）
+        data1 (RunningStats or np.ndarray): 条件1のデータ。load_stalk_rmsd()の集計、または shape: (num_samples, num_timesteps)
+        data2 (RunningStats or np.ndarray): 条件2のデータ。load_stalk_rmsd()の集計、または shape: (num_samples, num_timesteps)
         output_csv_path (str or Path): 出力CSVの保存パス
-        list1_name (str): df_list1 のラベル名（列名に使用）
-        list2_name (str): df_list2 のラベル名（列名に使用）
+        list1_name (str): data1 のラベル名（列名に使用）
+        list2_name (str): data2 のラベル名（列名に使用）
     """
-    def get_mean_std(df_list):
-        arrays = [df.values.flatten() for df in df_list]
-        data = np.vstack(arrays)
-        mean = np.mean(data, axis=0)
-        std = np.std(data, axis=0)
-        return mean, std
+    def get_mean_std(data):
+        # load_stalk_rmsd()のRunningStatsはそのまま、配列はseedの行をまとめて集計する
+        stats = data if isinstance(data, RunningStats) else RunningStats().update(data)
+        return stats.mean, stats.std()
 
-    mean1, std1 = get_mean_std(df_list1)
-    mean2, std2 = get_mean_std(df_list2)
+    mean1, std1 = get_mean_std(data1)
+    mean2, std2 = get_mean_std(data2)
 
     timesteps = np.arange(len(mean1))
 
@@ -144,31 +137,29 @@ def save_mean_std_two_groups(
 
     df.to_csv(output_csv_path, index=False, encoding="utf-8-sig")
 
-def load_stalk_rmsd(csv_dir, state="free", average_window=None):
-    # List all the parquet files
-    paths = [str(file) for file in pathlib.Path(csv_dir).rglob(f"{state}.csv")]
-    paths = sorted(paths)
-
-    # Load dataframes
-    df_list = []
-    indexs = []
-    for path in paths:
-        df = pd.read_csv(path)
-
-        if len(df) != 10**5:
-          continue
+def load_stalk_rmsd(csv_dir, state="free", average_window=None, dataset=None, cache_dir=None, n_workers=None, verbose=False):
+    """
+    各時刻のstalk RMSDの平均と分散を、seedを1本ずつ読みながら集計する。
+    全seedの (num_samples, num_timesteps) 行列は作らないので、メモリはseed数によらない。
 
-        #calculate moving average
-        if average_window:
-          df['stalk_rmsd'] = df['stalk_rmsd'].rolling(window=average_window).mean()
+    Returns:
+        RunningStats: 10**5フレームのトラジェクトリの各時刻の統計量（running_stats.py）
+    """
+    stats = RunningStats()
 
-        df_list.append(df["stalk_rmsd"])
-        
+    # Read the csv files one seed at a time, or the dataset when csv_dir is a case in it
+    for rmsd in iter_cv(csv_dir, f"{state}.csv", "stalk_rmsd", dataset, cache_dir=cache_dir, n_workers=n_workers, verbose=verbose):
+      # 10**5フレームのトラジェクトリのみ使う
+      if len(rmsd) != 10**5:
+        continue
 
-        indexs.append(np.arange(len(df)))
+      #calculate moving average
+      if average_window:
+        rmsd = pd.Series(rmsd).rolling(window=average_window).mean().to_numpy()
 
+      stats.update(rmsd)
 
-    return df_list
+    return stats
 
 def generate_colors(num_colors, cmap_name='viridis'):
     """
@@ -186,13 +177,17 @@ def main():
     parser.add_argument("--dir-kinesin", type=str, required=True, help="Directory containing CVs in csv format")
     parser.add_argument("--dir-no-kinesin", type=str, required=True, help="Directory containing CVs in csv format")
     parser.add_argument("--out", type=str, required=True, help="Output file name")
+    parser.add_argument("--dataset", type=str, required=False, help="Dataset written by step01_build_dataset.py. --dir-kinesin and --dir-no-kinesin then name cases in it")
     parser.add_argument("--state", type=str, required=True, help="free or alf3")
+    parser.add_argument("--cache-dir", type=str, required=False, help="Directory of the ensemble cache, disabled by default")
+    parser.add_argument("--n-workers", type=int, required=False, help="Number of threads reading the CV files, see cv_dataset.read_cv_files()")
+    parser.add_argument("--verbose", action="store_true", help="Print the time spent reading each CV file")
     args = parser.parse_args()
 
-    df_list_kinesin = load_stalk_rmsd(args.dir_kinesin, state=args.state, average_window=None)
-    df_list_no_kinesin = load_stalk_rmsd(args.dir_no_kinesin, state=args.state, average_window=None)
+    data_kinesin = load_stalk_rmsd(args.dir_kinesin, state=args.state, average_window=None, dataset=args.dataset, cache_dir=args.cache_dir, n_workers=args.n_workers, verbose=args.verbose)
+    data_no_kinesin = load_stalk_rmsd(args.dir_no_kinesin, state=args.state, average_window=None, dataset=args.dataset, cache_dir=args.cache_dir, n_workers=args.n_workers, verbose=args.verbose)
 
-    plot_mean_and_std_two_groups(df_list_kinesin, df_list_no_kinesin, save_path=args.out)
+    plot_mean_and_std_two_groups(data_kinesin, data_no_kinesin, save_path=args.out)
 
       
 
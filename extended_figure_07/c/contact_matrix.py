@@ -0,0 +1,119 @@
+import ast
+
+import numpy as np
+
+
+# Neck mimic contact matrices of NativeContacts.results() and the types of their values
+MATRIX_DTYPES = {
+    "contact_resids_in_neckmimic": np.int32,
+    "docks": np.bool_,
+}
+
+
+def matrix_columns(column_name, resids):
+    """
+    Names of the typed columns holding a dict-valued column as a dense matrix.
+
+    Parameters:
+    column_name (str): "contact_resids_in_neckmimic" or "docks".
+    resids (iterable of int): Residues of the matrix, e.g. Neckmimic.neckmimic_range.
+
+    Returns:
+    list of str: One column per residue, e.g. "docks_7884".
+    """
+    return [f"{column_name}_{resid}" for resid in resids]
+
+
+def matrix_to_dicts(matrix, resids):
+    """
+    Convert a dense matrix into per-frame dicts keyed by residue, holding the nonzero entries only.
+
+    Parameters:
+    matrix (numpy.ndarray): Matrix of shape (n_frames, n_resids).
+    resids (iterable of int): Residues of the matrix columns.
+
+    Returns:
+    list of dict: One dict per frame.
+    """
+    resids = np.asarray(resids)
+    return [dict(zip(resids[row != 0].tolist(), row[row != 0].tolist())) for row in np.asarray(matrix)]
+
+
+def dicts_to_matrix(dicts, resids, dtype=np.int32):
+    """
+    Convert per-frame dicts keyed by residue into a dense matrix, the inverse of matrix_to_dicts().
+
+    Parameters:
+    dicts (iterable of dict or str): One dict per frame, or its repr as written to the CSV outputs.
+    resids (iterable of int): Residues of the matrix columns. Other keys are ignored.
+    dtype (numpy.dtype): Type of the matrix.
+
+    Returns:
+    numpy.ndarray: Matrix of shape (n_frames, n_resids), zero for the residues missing from a dict.
+    """
+    columns = {resid: i for i, resid in enumerate(resids)}
+    dicts = [ast.literal_eval(d) if isinstance(d, str) else d for d in dicts]
+    matrix = np.zeros((len(dicts), len(columns)), dtype=dtype)
+    for row, d in zip(matrix, dicts):
+        for resid, value in d.items():
+            if resid in columns:
+                row[columns[resid]] = value
+    return matrix
+
+
+def _is_matrix(values):
+    """
+    Whether a neck mimic contact column is a matrix of NativeContacts.results() rather than per-frame dicts
+    as returned by msm_utils.
+    """
+    return isinstance(values, np.ndarray) and values.dtype != object
+
+
+def as_dicts(values, resids):
+    """
+    Per-frame dicts of a neck mimic contact column, converted from a matrix with matrix_to_dicts().
+    Dicts are returned as they are.
+
+    Parameters:
+    values (numpy.ndarray or list of dict): Matrix of shape (n_frames, n_resids) or one dict per frame.
+    resids (iterable of int): Residues of the matrix columns.
+
+    Returns:
+    list of dict: One dict per frame.
+    """
+    return matrix_to_dicts(values, resids) if _is_matrix(values) else list(values)
+
+
+def contact_columns(ret, resids):
+    """
+    Typed columns of the neck mimic contact matrices of NativeContacts.results(). Per-frame dicts, as
+    returned by msm_utils, are converted with dicts_to_matrix() first.
+
+    Parameters:
+    ret (dict): Results of NativeContacts.results() or of msm_utils.
+    resids (iterable of int): Residues of the matrix columns.
+
+    Returns:
+    dict: Column name to array of shape (n_frames,), see matrix_columns().
+    """
+    columns = {}
+    for column_name, dtype in MATRIX_DTYPES.items():
+        values = ret[column_name]
+        matrix = np.asarray(values, dtype=dtype) if _is_matrix(values) else dicts_to_matrix(values, resids, dtype)
+        columns.update(zip(matrix_columns(column_name, resids), matrix.T))
+    return columns
+
+
+def read_matrix(df, column_name, resids):
+    """
+    Read a dict-valued column back from its typed columns without parsing.
+
+    Parameters:
+    df (pandas.DataFrame): CVs holding the columns of matrix_columns().
+    column_name (str): "contact_resids_in_neckmimic" or "docks".
+    resids (iterable of int): Residues of the matrix columns.
+
+    Returns:
+    numpy.ndarray: Matrix of shape (n_frames, n_resids).
+    """
+    return df[matrix_columns(column_name, resids)].to_numpy()
@@ -0,0 +1,217 @@
+import numpy as np
+
+
+# Residues of the neck mimic, the same as config.Neckmimic.neckmimic_range of extended_figure_07/c
+NECKMIMIC_RANGE = range(7884, 7898 + 1)
+
+
+def read_itp_sections(itp, names):
+    """
+    Read the data lines of sections of a GROMACS-style ITP file written for GENESIS.
+    Comments after ";" and preprocessor lines starting with "#" are skipped.
+
+    Parameters:
+    itp (str): ITP file.
+    names (iterable of str): Section names, e.g. ["atoms", "pairs"].
+
+    Returns:
+    dict: Section name to list of lines split into fields.
+    """
+    sections = {name: [] for name in names}
+    current = None
+    with open(itp) as f:
+        for line in f:
+            line = line.split(";", 1)[0].strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("["):
+                current = line.strip("[] ")
+                continue
+            if current in sections:
+                sections[current].append(line.split())
+    return sections
+
+
+def read_native_pairs(itp):
+    """
+    Read the native contacts of a Go model from the [ pairs ] section of its ITP file.
+
+    Parameters:
+    itp (str): ITP file of the whole system, e.g. top/alf3.itp.
+
+    Returns:
+    tuple: (n_atoms, i, j, r0) where
+        - n_atoms is the number of atoms in the [ atoms ] section.
+        - i and j are 0-based atom indices of shape (n_pairs,).
+        - r0 is the native distance of each pair in Angstrom.
+    """
+    sections = read_itp_sections(itp, ["atoms", "pairs"])
+    pairs = sections["pairs"]
+    if not pairs:
+        raise ValueError(f"{itp} has no [ pairs ] section.")
+
+    i = np.array([int(fields[0]) for fields in pairs]) - 1
+    j = np.array([int(fields[1]) for fields in pairs]) - 1
+    # ITP distances are in nm, DCD coordinates in Angstrom
+    r0 = np.array([float(fields[3]) for fields in pairs]) * 10.0
+    return len(sections["atoms"]), i, j, r0
+
+
+class NativeContacts:
+    """
+    Native contact analysis of a Go model, vectorized over the native pairs.
+
+    The pair list is read once from the ITP file and kept as index arrays into the coordinates of
+    the selected atoms, so each frame costs one gather and one distance evaluation over all the
+    pairs. A pair is formed when its distance is below ratio times its native distance. The RMSD
+    is taken over the selected atoms after optimal superposition onto the reference structure.
+
+    Attributes:
+    indices (numpy.ndarray): 0-based indices of the selected atoms, the atoms to pass to evaluate().
+    n_pairs (int): Number of native pairs within the selection.
+    neckmimic_range (range): Residues of the neck mimic.
+    """
+
+    def __init__(self, itp, atoms, neckmimic, ratio=1.2, neckmimic_range=NECKMIMIC_RANGE):
+        """
+        Parameters:
+        itp (str): ITP file of the whole system. Its atom numbers index the trajectory.
+        atoms (AtomGroup): Selected atoms of the full-system topology. Their coordinates are the reference structure.
+        neckmimic (bool): Whether the system has the neck mimic. Without it no pair is assigned to neck mimic residues.
+        ratio (float): Factor on the native distance below which a pair is formed.
+        neckmimic_range (range): Residues of the neck mimic.
+        """
+        n_atoms, i, j, r0 = read_native_pairs(itp)
+        if n_atoms != atoms.universe.atoms.n_atoms:
+            raise ValueError(f"{itp} has {n_atoms} atoms but the topology has {atoms.universe.atoms.n_atoms}. "
+                             "Native contacts need the full-system topology and trajectory.")
+
+        # Keep the pairs within the selection and index them into its coordinates
+        self.indices = np.unique(atoms.indices)
+        local = np.full(n_atoms, -1)
+        local[self.indices] = np.arange(len(self.indices))
+        keep = (local[i] >= 0) & (local[j] >= 0)
+        self._i, self._j = local[i[keep]], local[j[keep]]
+        self._cutoff2 = (ratio * r0[keep]) ** 2
+        self.n_pairs = int(keep.sum())
+        if self.n_pairs == 0:
+            raise ValueError(f"{itp} has no native pairs within the selected atoms.")
+
+        # Pairs between a neck mimic residue and a residue outside the neck mimic, as a (n_pairs, n_resids) map
+        self.neckmimic_range = neckmimic_range
+        resids = atoms.universe.atoms.resids[self.indices]
+        self._neckmimic_pairs = np.zeros((self.n_pairs, len(neckmimic_range)), dtype=np.int32)
+        if neckmimic:
+            in_i = np.isin(resids[self._i], neckmimic_range)
+            in_j = np.isin(resids[self._j], neckmimic_range)
+            for side, other, index in ((in_i, in_j, self._i), (in_j, in_i, self._j)):
+                pairs = np.flatnonzero(side & ~other)
+                self._neckmimic_pairs[pairs, resids[index[pairs]] - neckmimic_range.start] = 1
+
+        # Reference structure centered at the origin
+        reference = atoms.universe.atoms.positions[self.indices].astype(np.float64)
+        self._reference = reference - reference.mean(axis=0)
+
+    def allocate(self, n_frames):
+        """
+        Arrays for the values of n_frames frames, filled frame by frame from evaluate().
+
+        Returns:
+        dict: Zero arrays keyed as the values of evaluate().
+        """
+        return {
+            "contact_count": np.zeros(n_frames, dtype=np.int32),
+            "rmsd": np.zeros(n_frames),
+            "neckmimic_contacts": np.zeros((n_frames, len(self.neckmimic_range)), dtype=np.int32),
+        }
+
+    def evaluate(self, positions):
+        """
+        Evaluate the native contacts and the RMSD.
+
+        Parameters:
+        positions (array-like): Coordinates of the atoms in self.indices, of shape (n_atoms, 3) for one
+            frame or (n_frames, n_atoms, 3) for several.
+
+        Returns:
+        dict: Values of shape (n_frames,) or scalars for one frame where
+            - "contact_count" is the number of formed native pairs.
+            - "rmsd" is the RMSD from the reference structure in Angstrom.
+            - "neckmimic_contacts" is the number of formed pairs of each neck mimic residue, of shape (..., n_resids).
+        """
+        # A contiguous copy makes the sums independent of the layout of the input, e.g. a reader view
+        positions = np.ascontiguousarray(positions, dtype=np.float64)
+        single = positions.ndim == 2
+        if single:
+            positions = positions[np.newaxis]
+
+        # Formed pairs of all frames at once
+        d = positions[:, self._i] - positions[:, self._j]
+        formed = np.einsum("fpk,fpk->fp", d, d) < self._cutoff2
+
+        values = {
+            "contact_count": formed.sum(axis=1, dtype=np.int32),
+            "rmsd": self.rmsd(positions),
+            "neckmimic_contacts": formed.astype(np.int32) @ self._neckmimic_pairs,
+        }
+        if single:
+            return {name: value[0] for name, value in values.items()}
+        return values
+
+    def rmsd(self, positions):
+        """
+        RMSD from the reference structure after optimal superposition (Kabsch), for each frame.
+
+        Parameters:
+        positions (numpy.ndarray): Coordinates of shape (n_frames, n_atoms, 3).
+
+        Returns:
+        numpy.ndarray: RMSD of shape (n_frames,) in Angstrom.
+        """
+        x = positions - positions.mean(axis=1, keepdims=True)
+        u, s, vt = np.linalg.svd(np.einsum("fai,aj->fij", x, self._reference))
+        # Exclude reflections
+        s[:, -1] *= np.sign(np.linalg.det(u @ vt))
+        e0 = np.einsum("fai,fai->f", x, x) + np.einsum("ai,ai->", self._reference, self._reference)
+        return np.sqrt(np.maximum(e0 - 2.0 * s.sum(axis=1), 0.0) / len(self.indices))
+
+    def evaluate_reader(self, reader, start=None, stop=None, step=None, chunk=1000):
+        """
+        Evaluate the frames of a reader of dcd_reader in chunks of frames.
+
+        Parameters:
+        reader (SubsetDCDReader, ChainedDCDReader or ArchiveReader): Reader of the trajectory, see dcd_reader.open_dcd().
+        start, stop, step (int, optional): Frames to process, as in a slice.
+        chunk (int): Number of frames evaluated at once.
+
+        Returns:
+        dict: Values as returned by evaluate() for the frames.
+        """
+        frames = range(reader.n_frames)[start:stop:step]
+        values = self.allocate(len(frames))
+        for i in range(0, len(frames), chunk):
+            block = frames[i:i + chunk]
+            for name, value in self.evaluate(reader.positions(self.indices, block.start, block.stop, block.step)).items():
+                values[name][i:i + len(block)] = value
+        return values
+
+    def results(self, values):
+        """
+        Per-frame results in the layout of the step01 outputs.
+
+        Parameters:
+        values (dict): Values of all frames as returned by evaluate().
+
+        Returns:
+        dict: Results where
+            - "contact_count_ratio" is the fraction of formed native pairs.
+            - "rmsd" is the RMSD from the reference structure.
+            - "contact_resids_in_neckmimic" is the number of formed pairs of each neck mimic residue, of shape (n_frames, n_resids).
+            - "docks" tells whether each neck mimic residue has a formed pair, of shape (n_frames, n_resids).
+        """
+        return {
+            "contact_count_ratio": values["contact_count"] / self.n_pairs,
+            "rmsd": values["rmsd"],
+            "contact_resids_in_neckmimic": values["neckmimic_contacts"],
+            "docks": values["neckmimic_contacts"] > 0,
+        }
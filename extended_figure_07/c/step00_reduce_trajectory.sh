@@ -0,0 +1,22 @@
+#!/bin/bash -e
+
+# Define input/output directories
+DATA_DIR="/path/to/data_dir"
+REDUCED_DIR="/path/to/reduced_dir"
+
+# Write trajectories reduced to kinesin and the microtubule subunits C, G and L.
+# Residue numbers are kept, so the step01 scripts run on the reduced files
+# by pointing their data directory to ${REDUCED_DIR}.
+uv run \
+  --with numpy \
+  --with MDAnalysis \
+  ./step01_batch.py \
+    --script step00_reduce_trajectory \
+    --case kinesin \
+    --seeds 1 100 \
+    -- \
+      --keep "resid 7516-8266" "resid 836-1252" "resid 2506-2922" "resid 4593-5010" \
+      --dcd "${DATA_DIR}/{case}/{sim}/trajectory.dcd" \
+      --pdb "${DATA_DIR}/{case}/pdb/free.pdb" \
+      --out "${REDUCED_DIR}/{case}/{sim}/trajectory.dcd" \
+      --out-pdb "${REDUCED_DIR}/{case}/pdb/free.pdb"
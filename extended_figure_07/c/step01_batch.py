@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+import argparse
+import importlib
+import os
+import sys
+import time
+import traceback
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+warnings.filterwarnings("ignore")
+warnings.warn = lambda *args, **kwargs: None
+
+
+# State kept by each worker process for its whole lifetime
+_module = None
+_topologies = {}
+
+
+def init_worker(module_name):
+    """
+    Import the step01 module once per worker process.
+
+    Parameters:
+    module_name (str): Name of the step01 module, e.g. "step01_write_cv".
+    """
+    global _module
+    warnings.filterwarnings("ignore")
+    _module = importlib.import_module(module_name)
+
+
+def process_task(script_args):
+    """
+    Run the step01 module on one trajectory inside a worker process.
+    Parsed topologies and reference structures are kept in the worker and reused by later tasks.
+
+    Parameters:
+    script_args (list of str): Command-line arguments of the step01 module for this trajectory.
+
+    Returns:
+    tuple: (out, elapsed) where
+        - out is the output file name.
+        - elapsed is the wall time in seconds.
+    """
+    start = time.perf_counter()
+    args = _module.get_parser().parse_args(script_args)
+    _module.run(args, topologies=_topologies)
+    return args.out, time.perf_counter() - start
+
+
+def parse_case(tokens):
+    """
+    Parse a case given as NAME [KEY=VALUE ...].
+
+    Parameters:
+    tokens (list of str): Case name followed by per-case template variables.
+
+    Returns:
+    tuple: (name, variables) where variables is a dict of the template variables.
+    """
+    name, *assignments = tokens
+    variables = {}
+    for assignment in assignments:
+        key, sep, value = assignment.partition("=")
+        if not sep:
+            raise ValueError(f"Case variable must be KEY=VALUE: {assignment}")
+        variables[key] = value
+    return name, variables
+
+
+def expand_tasks(module_name, cases, states, seeds, template_args, overwrite=False):
+    """
+    Expand the case/state/seed grid into the command-line arguments of each trajectory.
+    Trajectories without a DCD file or with an existing output are skipped as in the shell drivers,
+    unless overwrite is set.
+
+    Parameters:
+    module_name (str): Name of the step01 module.
+    cases (list of tuple): (name, variables) pairs returned by parse_case().
+    states (list of str): States such as "free" and "alf3".
+    seeds (tuple): First and last seed, both inclusive.
+    template_args (list of str): Arguments of the step01 module. The fields {case}, {state}, {seed},
+        {sim} (e.g. sim-0001) and the per-case variables are substituted.
+    overwrite (bool): Also process trajectories whose output exists.
+
+    Returns:
+    list of list of str: Arguments of the trajectories to process.
+    """
+    parser = importlib.import_module(module_name).get_parser()
+
+    tasks = []
+    for case, variables in cases:
+        for state in states:
+            for seed in range(seeds[0], seeds[1] + 1):
+                fields = dict(variables, case=case, state=state, seed=seed, sim=f"sim-{seed:04d}")
+                script_args = [arg.format(**fields) for arg in template_args]
+                args = parser.parse_args(script_args)
+
+                # step00_index_trajectory.py takes the DCD files of several runs
+                missing = [dcd for dcd in ([args.dcd] if isinstance(args.dcd, str) else args.dcd) if not Path(dcd).is_file()]
+                if missing:
+                    print(f"Skipping: {missing[0]} not found")
+                    continue
+                if not overwrite and Path(args.out).exists():
+                    print(f"Skipping: {args.out} exists")
+                    continue
+
+                Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+                tasks.append(script_args)
+
+    return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a step01 script over a case/state/seed grid in one pool of worker processes",
+        usage="%(prog)s --script MODULE --case NAME [KEY=VALUE ...] [options] -- SCRIPT_ARGS ...",
+    )
+    parser.add_argument("--script", type=str, required=True, help="step01 module to run, e.g. step01_write_cv")
+    parser.add_argument("--case", type=str, nargs="+", action="append", required=True, metavar="NAME [KEY=VALUE]", help="Case name and its template variables, can be repeated")
+    parser.add_argument("--state", type=str, nargs="+", default=[""], help="States to process, e.g. free alf3")
+    parser.add_argument("--seeds", type=int, nargs=2, default=[1, 100], metavar=("FIRST", "LAST"), help="Seed range, both inclusive")
+    parser.add_argument("--n-workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--overwrite", action="store_true", help="Process trajectories whose output exists, e.g. to refresh outputs through --cache-dir")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER, help="Arguments of the step01 script with template fields")
+    args = parser.parse_args()
+
+    module_name = Path(args.script).stem
+    template_args = args.script_args[1:] if args.script_args[:1] == ["--"] else args.script_args
+    cases = [parse_case(tokens) for tokens in args.case]
+
+    # List the trajectories to process
+    tasks = expand_tasks(module_name, cases, args.state, args.seeds, template_args, args.overwrite)
+    if not tasks:
+        print("Nothing to process")
+        return
+
+    # Process all the trajectories in one pool of long-lived workers
+    failures = []
+    n_workers = max(1, min(args.n_workers, len(tasks)))
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(module_name,)) as executor:
+        futures = {executor.submit(process_task, task): task for task in tasks}
+        for i, future in enumerate(as_completed(futures), start=1):
+            try:
+                out, elapsed = future.result()
+                print(f"[{i}/{len(tasks)}] {out} ({elapsed:.1f} s)")
+            except Exception:
+                failures.append(futures[future])
+                print(f"[{i}/{len(tasks)}] Failed: {' '.join(futures[future])}")
+                traceback.print_exc()
+
+    if failures:
+        sys.exit(f"{len(failures)} of {len(tasks)} trajectories failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 import argparse
-import pathlib
 import warnings
 import seaborn as sns
 
@@ -14,9 +13,11 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import pickle
-import ast
 from collections import Counter
 from config import Neckmimic
+from contact_matrix import MATRIX_DTYPES, dicts_to_matrix, matrix_columns, read_matrix
+from cv_ensemble import load_ensemble
+from cv_transitions import classify_paths, first_above, gather_windows, unwrap_frames
 
 def plot_heatmap(df, save_path, font_size=20, normalize=True):
     """
@@ -122,71 +123,42 @@ def save_plot_heatmap(df, output_csv, normalize=True):
 
 def convert_and_sum_contact_sets(df_list, number_range, name_mapping, column_name='contact_resids_in_neckmimic'):
     """
-    df_list: List of DataFrames
+    df_list: List of DataFrames of the same length (e.g., the windows around the transitions),
+        or an array of shape (seeds, window, residues) holding the matrices of column_name
     number_range: Iterable (e.g., range(7884, 7899))
     name_mapping: Dict for renaming columns (e.g., {7884: 'A', 7885: 'B', ...})
+    column_name: 'contact_resids_in_neckmimic' sums the contact counts of the seeds,
+        'docks' takes the OR of the dock flags of the seeds
 
     Returns: Summed and renamed DataFrame
     """
-    # 初期化：インデックス0-300、カラム7884-7898、すべて0
-    result_df = pd.DataFrame(0, index=range(0, len(df_list[0])), columns=number_range)
-
-    for df in df_list:
-        # 一時的なカウント用DataFrame
-        temp_df = pd.DataFrame(0, index=range(0, len(df_list[0])), columns=number_range)
-
-        for idx, row in df.iterrows():
-            contacts = row[column_name]  # ここは辞書(dict型)になっている！
-            for num in number_range:
-                # contactsにその番号が含まれていれば、そのカウント値を加算
-                if num in contacts:
-                    temp_df.at[idx, num] = contacts[num]
-
-        # 各dfごとに加算
-        if column_name == 'contact_resids_in_neckmimic':
-          result_df += temp_df
-        elif column_name == 'docks':
-          result_df |= temp_df
-
-    # 最後にカラム名をname_mappingでリネーム
-    result_df = result_df.rename(columns=name_mapping)
-    result_df.index.name = 'index'
+    # 全シードを (シード, 窓の行, 残基) の配列に積む
+    # parquetは残基ごとの型付きカラム、csvは辞書カラム（文字列のままでも可）から読む
+    if isinstance(df_list, np.ndarray):
+      matrices = df_list.astype(np.int64)
+    else:
+      matrices = np.stack([
+          read_matrix(df, column_name, number_range) if column_name not in df
+          else dicts_to_matrix(df[column_name], number_range, MATRIX_DTYPES[column_name])
+          for df in df_list
+      ]).astype(np.int64)
+
+    # シード方向に一度に集計する
+    if column_name == 'contact_resids_in_neckmimic':
+      matrix = matrices.sum(axis=0)
+    elif column_name == 'docks':
+      matrix = matrices.any(axis=0).astype(np.int64)
+    else:
+      raise ValueError(f"Unknown column: {column_name}")
+
+    # インデックス0-300、カラムはname_mappingでリネームした残基名
+    columns = [name_mapping.get(num, num) for num in number_range]
+    result_df = pd.DataFrame(matrix, index=pd.RangeIndex(len(matrix), name='index'), columns=columns)
 
     return result_df
 
 
 
-def extract_transition2(df, previous_steps=20, post_steps=20):
-  """
-  idxがneckmimic結合のタイミングに該当する。neckmimic結合の前後20stepを取る場合、
-    previous_steps=20
-    post_steps=20
-  とする
-  """
-  if df['phi'].min() < 0: #1度でもpath2の方向に進んだらはじく
-    return None, "path2"
-
-  last_phi = df['phi'].iloc[-1]
-  if last_phi > 0:
-    # 条件を満たす最初の行のインデックスを取得
-    idx = (df['contact_count_ratio'] > 0.99).idxmax()
-  
-    # その行までのデータを取得
-    df_subset = df.loc[idx-previous_steps:idx+post_steps]
-    if len(df_subset) != (previous_steps + post_steps + 1):
-      print(f"{len(df_subset)=}")
-      return None, "path2"
-    return df_subset, 'path1'
-  elif last_phi < -1:
-    # 条件を満たす最初の行のインデックスを取得
-    idx = (df['contact_count_ratio'] > 0.99).idxmax()
-  
-    # その行までのデータを取得
-    df_subset = df.loc[:idx]
-    return df_subset, 'path2'
-  else:
-    raise RuntimeError
-
 def plot_residue_counts_with_labels(counts_dict, save_path="residue_counts.png"):
     # 残基ラベルをリスト化して、番号順にソート（番号を抜き出して比較）
     residues = sorted(counts_dict.keys(), key=lambda x: int(''.join(filter(str.isdigit, x))))
@@ -217,72 +189,53 @@ def count_all_occurrences(l):
         counter.update(s)  # セット内の要素を全部カウント
     return dict(counter)
 
-def unwrap_angles(df):
+def expand_contact_columns(df):
     """
-    データフレーム内の 'theta' 列と 'phi' 列に np.unwrap を適用し、
-    修正後のデータフレームを返す関数。
-
-    Parameters:
-        df (pd.DataFrame): thetaとphi列を含むデータフレーム。
-
-    Returns:
-        pd.DataFrame: np.unwrap処理後のデータフレーム。
+    csvの辞書カラムを文字列から復元し、parquetと同じ残基ごとの型付きカラムに展開する
+    （parquetは型付きカラムなのでそのまま返す）
     """
-    # データフレームのコピーを作成
-    df_unwrapped = df.copy()
-
-    # np.unwrap処理をtheta列とphi列に適用
-    df_unwrapped['theta'] = np.unwrap(df_unwrapped['theta'].values, period=2 * np.pi)
-    df_unwrapped['phi'] = np.unwrap(df_unwrapped['phi'].values, period=2 * np.pi)
-
-    return df_unwrapped
-
+    resids = Neckmimic.neckmimic_range
+    for column_name, dtype in MATRIX_DTYPES.items():
+      if column_name in df:
+        matrix = dicts_to_matrix(df[column_name], resids, dtype)
+        df = df.drop(columns=column_name).assign(**dict(zip(matrix_columns(column_name, resids), matrix.T)))
+    return df
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--dir", type=str, required=True, help="Directory containing CVs in parquet format")
     parser.add_argument("--out", type=str, required=True, help="Output file name")
+    parser.add_argument("--pattern", type=str, default="*.parquet", help="File name pattern of the CV files, e.g. *.csv for csv outputs of step01")
+    parser.add_argument("--dataset", type=str, required=False, help="Dataset written by step01_build_dataset.py. --dir then names a case in it")
     parser.add_argument("--target", type=int, required=False, help="Target simulation number")
+    parser.add_argument("--cache-dir", type=str, required=False, help="Directory of the ensemble cache, disabled by default")
+    parser.add_argument("--n-workers", type=int, required=False, help="Number of threads reading the CV files, see cv_dataset.read_cv_files()")
+    parser.add_argument("--verbose", action="store_true", help="Print the time spent reading each CV file")
     args = parser.parse_args()
 
-    # List all the parquet files
-    paths = [str(file) for file in pathlib.Path(args.dir).rglob("*.csv")]
-    paths = sorted(paths)
+    # List all the CV files, or the trajectories of the case in the dataset, with the rows of the sim3 stage only
+    columns = ["theta", "phi", "contact_count_ratio", *matrix_columns('contact_resids_in_neckmimic', Neckmimic.neckmimic_range)]
+    ensemble = load_ensemble(args.dir, args.pattern, columns, args.dataset, stage="sim3", cache_dir=args.cache_dir, convert=expand_contact_columns, n_workers=args.n_workers, verbose=args.verbose)
 
     # Specify target path is args.target is defined
-    paths = paths if args.target is None else paths[args.target-1:args.target]
-
-    # Load dataframes
-    df_list = []
-    indexs = []
-    last_contacts = []
-    contact_resids_in_neckmimic_lasts = []
-    for path in paths:
-        df = pd.read_csv(path)
-        df['contact_resids_in_neckmimic'] = df['contact_resids_in_neckmimic'].apply(ast.literal_eval)
-        df['docks'] = df['docks'].apply(ast.literal_eval)
-
-        # Split trajectory
-        sim1 = df.iloc[:2000]
-        sim2 = df.iloc[2000:2300]
-        sim3 = df.iloc[2300:22300]
-        sim4 = df.iloc[22300:22600]
-        sim5 = df.iloc[22600:42600]
-
-
-        # Unwrap angles
-        df = unwrap_angles(sim3)
-
-        # Extract only transition part
-        df, pth = extract_transition2(df, previous_steps=50, post_steps=20)
-        if pth == 'path1':
-          df = df.reset_index() 
-          df_list.append(df)    
-
-    #df_listの整形
+    if args.target is not None:
+      ensemble = ensemble.select(np.arange(len(ensemble)) == args.target-1)
+
+    # Unwrap angles of all the seeds at once
+    phi = unwrap_frames(ensemble.cv('phi'))
+
+    # Extract only transition part: 50 steps before to 20 steps after the first frame with contact_count_ratio > 0.99
+    rows = first_above(ensemble.cv('contact_count_ratio'), 0.99)
+    windows, valid = gather_windows(ensemble.values, rows, 50, 20, ensemble.lengths)
+    # 窓が途中で切れるトラジェクトリは除外する
+    path1 = (classify_paths(phi, ensemble.lengths) == 'path1') & valid
+
+    #全シードの窓の接触行列を (シード, 窓の行, 残基) の配列として取り出す
     config = Neckmimic()
+    resids = [ensemble.columns.index(column) for column in matrix_columns('contact_resids_in_neckmimic', config.neckmimic_range)]
+    matrices = windows[path1][:, :, resids]
 
-    converted_df = convert_and_sum_contact_sets(df_list, number_range=config.neckmimic_range, name_mapping=config.resname_dict, column_name='contact_resids_in_neckmimic')
+    converted_df = convert_and_sum_contact_sets(matrices, number_range=config.neckmimic_range, name_mapping=config.resname_dict, column_name='contact_resids_in_neckmimic')
 
 
     #Plot
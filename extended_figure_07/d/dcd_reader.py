@@ -0,0 +1,597 @@
+import json
+import os
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+# Suffix and format tag of the trajectory archives written by write_archive()
+ARCHIVE_SUFFIX = ".dcdz"
+ARCHIVE_FORMAT = "dcdz-1"
+
+
+class TrajectoryReader:
+    """
+    Methods shared by the trajectory readers, built on their n_frames and positions().
+    """
+
+    def window(self, indices, frame, before, after):
+        """
+        Coordinates of the selected atoms in a window of frames around a frame, e.g. a transition.
+        The window is cut at the ends of the trajectory, not at the ends of the stages.
+
+        Parameters:
+        indices (array-like or slice): 0-based atom indices.
+        frame (int): Center frame.
+        before, after (int): Number of frames before and after it.
+
+        Returns:
+        numpy.ndarray: Coordinates of shape (n_frames, n_indices, 3).
+        """
+        return self.positions(indices, max(frame - before, 0), min(frame + after + 1, self.n_frames))
+
+    def center_of_geometry(self, indices, start=None, stop=None, step=None, chunk=1000):
+        """
+        Center of geometry of the selected atoms in each frame.
+
+        Parameters:
+        indices (array-like or slice): 0-based atom indices.
+        start, stop, step (int, optional): Frames to read.
+        chunk (int): Number of frames read at once.
+
+        Returns:
+        numpy.ndarray: Centers of shape (n_frames, 3).
+        """
+        frames = range(self.n_frames)[start:stop:step]
+        centers = np.zeros((len(frames), 3))
+        for i in range(0, len(frames), chunk):
+            block = frames[i:i + chunk]
+            positions = self.positions(indices, block.start, block.stop, block.step)
+            centers[i:i + len(block)] = positions.astype(np.float64).mean(axis=1)
+        return centers
+
+
+class SubsetDCDReader(TrajectoryReader):
+    """
+    Memory-mapped reader for CHARMM/NAMD/GENESIS DCD files that touches only the requested atoms.
+
+    A DCD frame is a fixed-size block of Fortran records: an optional unit cell record followed by
+    one record each for X, Y and Z. The whole trajectory is therefore mapped as an array of shape
+    (n_frames, 3, n_atoms) without reading it, and selecting a contiguous range of atoms gives a
+    zero-copy strided view. Only the pages holding the selected atoms are read from disk.
+
+    Attributes:
+    filename (str): DCD file.
+    n_atoms (int): Number of atoms per frame.
+    n_frames (int): Number of complete frames in the file.
+    first_step (int): MD step of the first frame, from the header.
+    save_interval (int): Number of MD steps between frames, from the header.
+    """
+
+    def __init__(self, filename):
+        self.filename = str(filename)
+        with open(self.filename, "rb") as f:
+            self._read_header(f)
+        self._map()
+
+    def _read_header(self, f):
+        # First record: "CORD" and 20 control integers, 84 bytes long
+        marker = f.read(4)
+        if len(marker) < 4:
+            raise ValueError(f"{self.filename} has no header yet.")
+        for endian in ("<", ">"):
+            if np.frombuffer(marker, dtype=f"{endian}i4")[0] == 84:
+                break
+        else:
+            raise ValueError(f"{self.filename} is not a DCD file.")
+        self._endian = endian
+        i4 = np.dtype(f"{endian}i4")
+
+        record = f.read(84)
+        if record[:4] != b"CORD":
+            raise ValueError(f"{self.filename} is not a DCD coordinate file.")
+        icntrl = np.frombuffer(record[4:], dtype=i4)
+        self.first_step = int(icntrl[1])
+        self.save_interval = int(icntrl[2])
+        f.read(4)
+
+        charmm = icntrl[19] != 0
+        self._has_unitcell = bool(charmm and icntrl[10] != 0)
+        self._n_dims = 4 if charmm and icntrl[11] != 0 else 3
+        if icntrl[8] != 0:
+            raise NotImplementedError(f"{self.filename} has fixed atoms, which are not supported.")
+
+        # Title record
+        length = np.frombuffer(f.read(4), dtype=i4)[0]
+        f.seek(length + 4, os.SEEK_CUR)
+
+        # Number of atoms
+        f.read(4)
+        self.n_atoms = int(np.frombuffer(f.read(4), dtype=i4)[0])
+        f.read(4)
+
+        # Frame layout in 4-byte words
+        self._header_size = f.tell()
+        f.seek(0)
+        self._header = f.read(self._header_size)
+        self._unitcell_words = 14 if self._has_unitcell else 0
+        self._record_words = self.n_atoms + 2
+        self._frame_words = self._unitcell_words + self._n_dims * self._record_words
+
+        # Check the record markers of the first frame
+        f.seek(self._header_size + 4 * self._unitcell_words)
+        marker = f.read(4)
+        if marker and np.frombuffer(marker, dtype=i4)[0] != 4 * self.n_atoms:
+            raise ValueError(f"{self.filename} has an unexpected frame layout.")
+
+    def _map(self):
+        # Map only complete frames; a trajectory that is still being written may end mid-frame
+        frame_bytes = 4 * self._frame_words
+        self.n_frames = (os.path.getsize(self.filename) - self._header_size) // frame_bytes
+        if self.n_frames == 0:
+            self._xyz = np.empty((0, 3, self.n_atoms), dtype=f"{self._endian}f4")
+            return
+
+        self._words = np.memmap(self.filename, dtype=f"{self._endian}f4", mode="r", offset=self._header_size, shape=(self.n_frames, self._frame_words))
+        records = self._words[:, self._unitcell_words:self._unitcell_words + 3 * self._record_words]
+        self._xyz = records.reshape(self.n_frames, 3, self._record_words)[:, :, 1:-1]
+
+    def refresh(self):
+        """
+        Map the frames appended since the file was opened or last refreshed,
+        e.g. while GENESIS is still writing the trajectory.
+
+        Returns:
+        int: Number of complete frames.
+        """
+        self._map()
+        return self.n_frames
+
+    def positions(self, indices, start=None, stop=None, step=None):
+        """
+        Coordinates of the selected atoms.
+
+        Parameters:
+        indices (array-like or slice): 0-based atom indices. Contiguous indices give a zero-copy view.
+        start, stop, step (int, optional): Frames to read.
+
+        Returns:
+        numpy.ndarray: Coordinates of shape (n_frames, n_indices, 3).
+        """
+        return self._xyz[start:stop:step, :, as_slice(indices)].transpose(0, 2, 1)
+
+
+class ChainedDCDReader(TrajectoryReader):
+    """
+    Reader of the DCD files of consecutive runs as one trajectory, e.g. sim1.dcd, sim2.dcd and sim3.dcd
+    of a switching simulation, without concatenating them.
+
+    A frame index holds the file, the byte offset, the stage and the MD step of every frame, so that a
+    frame or a window of frames is located by a lookup and read from its file alone. The files are
+    memory-mapped through SubsetDCDReader when first read, so the earlier stages are never scanned.
+    The index can be saved to a .npz file and loaded by open_dcd() in place of a DCD file.
+
+    Attributes:
+    filenames (list of str): DCD files in the order of the runs.
+    stage_names (list of str): Stage of each file, by default its stem (e.g. sim1).
+    n_atoms (int): Number of atoms per frame.
+    n_frames (int): Total number of complete frames.
+    file (numpy.ndarray): Index into filenames of each frame.
+    local (numpy.ndarray): Frame number of each frame within its file.
+    offset (numpy.ndarray): Byte offset of each frame within its file.
+    md_step (numpy.ndarray): MD step of each frame within its run.
+    """
+
+    def __init__(self, filenames, stage_names=None):
+        """
+        Parameters:
+        filenames (list of str): DCD files in the order of the runs.
+        stage_names (list of str, optional): Stage of each file. Defaults to the file stems.
+        """
+        self.filenames = [str(filename) for filename in filenames]
+        self.stage_names = [Path(filename).stem for filename in self.filenames] if stage_names is None else list(stage_names)
+        if len(self.stage_names) != len(self.filenames):
+            raise ValueError("Give one stage name per DCD file.")
+        self._readers = [SubsetDCDReader(filename) for filename in self.filenames]
+        self._build_index()
+
+    def _build_index(self):
+        n_atoms = {reader.n_atoms for reader in self._readers}
+        if len(n_atoms) != 1:
+            raise ValueError(f"The DCD files have different numbers of atoms: {sorted(n_atoms)}.")
+        self.n_atoms = n_atoms.pop()
+
+        counts = [reader.n_frames for reader in self._readers]
+        self.n_frames = sum(counts)
+        self.file = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+        self.local = np.arange(self.n_frames) - np.repeat(np.cumsum(counts) - counts, counts)
+        header = np.repeat([reader._header_size for reader in self._readers], counts)
+        frame_bytes = np.repeat([4 * reader._frame_words for reader in self._readers], counts)
+        self.offset = header + self.local * frame_bytes
+        first = np.repeat([reader.first_step for reader in self._readers], counts)
+        interval = np.repeat([reader.save_interval for reader in self._readers], counts)
+        self.md_step = first + self.local * interval
+        self._sizes = [os.path.getsize(filename) for filename in self.filenames]
+
+    def save(self, filename):
+        """
+        Save the frame index to a .npz file. Relative DCD paths are stored relative to its directory.
+
+        Parameters:
+        filename (str): Index file.
+        """
+        directory = Path(filename).resolve().parent
+        filenames = [os.path.relpath(Path(name).resolve(), directory) for name in self.filenames]
+        tmp = Path(filename).with_name(f".{Path(filename).name}.{os.getpid()}.npz")
+        np.savez(tmp, filenames=np.array(filenames), stage_names=np.array(self.stage_names), sizes=np.array(self._sizes),
+                 n_atoms=self.n_atoms, frame_file=self.file, local=self.local, offset=self.offset, md_step=self.md_step)
+        os.replace(tmp, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load a frame index saved by save(). The index is rebuilt from the DCD headers if any of
+        the files has changed size since, e.g. because a run was still being written.
+
+        Parameters:
+        filename (str): Index file.
+
+        Returns:
+        ChainedDCDReader: Reader over the indexed files.
+        """
+        with np.load(filename) as data:
+            directory = Path(filename).parent
+            filenames = [str(directory / name) for name in data["filenames"]]
+            stage_names = data["stage_names"].tolist()
+            if [os.path.getsize(name) for name in filenames] != data["sizes"].tolist():
+                return cls(filenames, stage_names)
+
+            self = cls.__new__(cls)
+            self.filenames, self.stage_names = filenames, stage_names
+            self._readers = [None] * len(filenames)
+            self._sizes = data["sizes"].tolist()
+            self.n_atoms = int(data["n_atoms"])
+            self.file = data["frame_file"]
+            for name in ("local", "offset", "md_step"):
+                setattr(self, name, data[name])
+            self.n_frames = len(self.file)
+        return self
+
+    def _reader(self, i):
+        # Map a file when it is first read
+        if self._readers[i] is None:
+            self._readers[i] = SubsetDCDReader(self.filenames[i])
+        return self._readers[i]
+
+    def refresh(self):
+        """
+        Map the frames appended to the files since they were indexed and update the index.
+
+        Returns:
+        int: Number of complete frames.
+        """
+        self._readers = [SubsetDCDReader(filename) for filename in self.filenames]
+        self._build_index()
+        return self.n_frames
+
+    def stages(self):
+        """
+        Frame ranges of the stages, in the layout of stage_index.STAGES.
+
+        Returns:
+        dict: Stage name to (start, stop) frames.
+        """
+        bounds = np.searchsorted(self.file, np.arange(len(self.filenames) + 1))
+        return {name: (int(bounds[i]), int(bounds[i + 1])) for i, name in enumerate(self.stage_names)}
+
+    def stage(self, frame):
+        """
+        Stage of a frame.
+        """
+        return self.stage_names[self.file[frame]]
+
+    def _segments(self, start, stop, step):
+        # Split the frames into parts within one file: (reader, local start, local stop, step) each
+        bounds = np.searchsorted(self.file, np.arange(len(self.filenames) + 1))
+        for i, part in split_frames(range(self.n_frames)[start:stop:step], bounds):
+            yield self._reader(i), int(self.local[part[0]]), int(self.local[part[-1]]) + 1, part.step
+
+    def positions(self, indices, start=None, stop=None, step=None):
+        """
+        Coordinates of the selected atoms, read from the files holding the frames.
+
+        Parameters:
+        indices (array-like or slice): 0-based atom indices.
+        start, stop, step (int, optional): Frames to read, as in a slice of the whole trajectory.
+
+        Returns:
+        numpy.ndarray: Coordinates of shape (n_frames, n_indices, 3).
+        """
+        parts = [reader.positions(indices, a, b, step) for reader, a, b, step in self._segments(start, stop, step)]
+        if not parts:
+            return self._reader(0).positions(indices, 0, 0)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+class ArchiveReader(TrajectoryReader):
+    """
+    Reader of a compressed trajectory archive written by write_archive(), with the interface of SubsetDCDReader.
+
+    The archive is a zip file holding the frames in chunks. The coordinates are quantized to integer
+    multiples of the archive precision (e.g. 0.01 Angstrom), and within a chunk every frame after the
+    first is stored as its difference to the previous frame, which is small and compresses well with
+    deflate. The chunk index in index.json gives the frames of each chunk and each chunk is a member
+    of its own, so a window of frames decodes only the chunks holding it.
+
+    Attributes:
+    filename (str): Archive file.
+    n_atoms (int): Number of atoms per frame.
+    n_frames (int): Number of frames.
+    first_step (int or None): MD step of the first frame, from the source DCD header.
+    save_interval (int or None): Number of MD steps between frames, from the source DCD header.
+    precision (float): Quantization step of the coordinates in Angstrom.
+    bounds (numpy.ndarray): First frame of each chunk followed by n_frames.
+    """
+
+    def __init__(self, filename, cache_frames=1000):
+        """
+        Parameters:
+        filename (str): Archive file.
+        cache_frames (int): Number of decoded frames kept, so that the atom groups read from one block
+            of frames in turn decode its chunks once. The most recent chunk is always kept.
+        """
+        self.filename = str(filename)
+        self._zip = zipfile.ZipFile(self.filename)
+        index = json.loads(self._zip.read("index.json"))
+        if index.get("format") != ARCHIVE_FORMAT:
+            raise ValueError(f"{self.filename} is not a trajectory archive of format {ARCHIVE_FORMAT}.")
+        self.n_atoms = index["n_atoms"]
+        self.n_frames = index["n_frames"]
+        self.first_step = index["first_step"]
+        self.save_interval = index["save_interval"]
+        self.precision = index["precision"]
+        self.bounds = np.array([start for start, _ in index["chunks"]] + [self.n_frames], dtype=np.int64)
+        self._cache = OrderedDict()
+        self._cache_frames = cache_frames
+
+    def __getstate__(self):
+        # Reopen the archive when unpickled, e.g. in the worker processes of MDAnalysis
+        return {"filename": self.filename, "cache_frames": self._cache_frames}
+
+    def __setstate__(self, state):
+        self.__init__(state["filename"], state["cache_frames"])
+
+    def refresh(self):
+        """
+        Archives are written complete, so nothing is appended.
+
+        Returns:
+        int: Number of frames.
+        """
+        return self.n_frames
+
+    def _chunk(self, i):
+        # Quantized coordinates of a chunk, of shape (n_frames, 3, n_atoms), decoded once while cached
+        if i in self._cache:
+            self._cache.move_to_end(i)
+            return self._cache[i]
+        with self._zip.open(f"{i:06d}/first.npy") as f:
+            first = np.lib.format.read_array(f)
+        with self._zip.open(f"{i:06d}/delta.npy") as f:
+            delta = np.lib.format.read_array(f)
+        quantized = np.empty((len(delta) + 1, 3, self.n_atoms), dtype=np.int32)
+        quantized[0] = first
+        np.cumsum(delta, axis=0, dtype=np.int32, out=quantized[1:])
+        quantized[1:] += first
+        self._cache[i] = quantized
+        while len(self._cache) > 1 and sum(len(chunk) for chunk in self._cache.values()) > self._cache_frames:
+            self._cache.popitem(last=False)
+        return quantized
+
+    def positions(self, indices, start=None, stop=None, step=None):
+        """
+        Coordinates of the selected atoms, decoded from the chunks holding the frames.
+
+        Parameters:
+        indices (array-like or slice): 0-based atom indices.
+        start, stop, step (int, optional): Frames to read.
+
+        Returns:
+        numpy.ndarray: Coordinates of shape (n_frames, n_indices, 3), rounded to the precision.
+        """
+        selection = as_slice(indices)
+        parts = []
+        for i, part in split_frames(range(self.n_frames)[start:stop:step], self.bounds):
+            local = part[0] - self.bounds[i], part[-1] - self.bounds[i] + 1
+            parts.append(self._chunk(i)[local[0]:local[1]:part.step, :, selection])
+        if not parts:
+            return np.zeros((0, len(np.arange(self.n_atoms)[selection]), 3), dtype=np.float32)
+        quantized = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return (quantized * self.precision).astype(np.float32).transpose(0, 2, 1)
+
+
+def split_frames(frames, bounds):
+    """
+    Split ascending frames into their parts within consecutive blocks of frames, e.g. files or chunks.
+
+    Parameters:
+    frames (range): Frames to split, e.g. range(n_frames)[start:stop:step].
+    bounds (numpy.ndarray): First frame of each block followed by the end of the last block.
+
+    Yields:
+    tuple: (block, part) for each block holding some of the frames, with part the range of those frames.
+    """
+    if frames.step < 0:
+        raise ValueError("Frames must be read in ascending order.")
+    if len(frames) == 0:
+        return
+    first, last = np.searchsorted(bounds, [frames[0], frames[-1]], side="right") - 1
+    for i in range(first, last + 1):
+        # Frames from the first one at or after the start of the block to the end of the block
+        part = frames[max(0, -(-(bounds[i] - frames.start) // frames.step)):
+                      max(0, -(-(bounds[i + 1] - frames.start) // frames.step))]
+        if len(part) > 0:
+            yield int(i), part
+
+
+def is_frame_index(filename):
+    """
+    Whether a trajectory file is a frame index saved by ChainedDCDReader.save() rather than a DCD file.
+    """
+    return Path(filename).suffix == ".npz"
+
+
+def is_archive(filename):
+    """
+    Whether a trajectory file is an archive written by write_archive() rather than a DCD file.
+    """
+    return Path(filename).suffix == ARCHIVE_SUFFIX
+
+
+def open_dcd(filename):
+    """
+    Open a trajectory: a DCD file, a frame index of several DCD files saved by ChainedDCDReader.save(),
+    or an archive written by write_archive().
+
+    Parameters:
+    filename (str): DCD file, .npz index file or .dcdz archive.
+
+    Returns:
+    SubsetDCDReader, ChainedDCDReader or ArchiveReader: Reader of the trajectory.
+    """
+    if is_frame_index(filename):
+        return ChainedDCDReader.load(filename)
+    if is_archive(filename):
+        return ArchiveReader(filename)
+    return SubsetDCDReader(filename)
+
+
+def dcd_files(filename):
+    """
+    DCD files of a trajectory: the files of a frame index in the order of the runs, or the file itself.
+    An archive is returned as itself; MDAnalysis reads it once mda_archive is imported.
+
+    Parameters:
+    filename (str): DCD file, .npz index file or .dcdz archive.
+
+    Returns:
+    list of str: Trajectory files.
+    """
+    if is_frame_index(filename):
+        with np.load(filename) as data:
+            return [str(Path(filename).parent / name) for name in data["filenames"]]
+    return [str(filename)]
+
+
+def write_subset_dcd(reader, indices, filename, chunk=1000):
+    """
+    Write the selected atoms of a DCD trajectory to a new DCD file.
+    The header (first step, save interval, time step, title) and the unit cells are copied unchanged.
+
+    Parameters:
+    reader (SubsetDCDReader): Reader of the source trajectory.
+    indices (array-like or slice): 0-based indices of the atoms to keep.
+    filename (str): Output DCD file.
+    chunk (int): Number of frames converted at once.
+    """
+    if reader._n_dims != 3:
+        raise NotImplementedError(f"{reader.filename} has 4D coordinates, which are not supported.")
+
+    selection = as_slice(indices)
+    n_atoms = len(np.arange(reader.n_atoms)[selection])
+    i4 = np.dtype(f"{reader._endian}i4")
+
+    # Header with the new number of atoms and frames
+    header = bytearray(reader._header)
+    header[8:12] = np.array([reader.n_frames], dtype=i4).tobytes()
+    header[-8:-4] = np.array([n_atoms], dtype=i4).tobytes()
+
+    # Record markers hold the record length in bytes
+    marker = np.array([4 * n_atoms], dtype=i4).view(reader._xyz.dtype)[0]
+    uc = reader._unitcell_words
+
+    with open(filename, "wb") as f:
+        f.write(header)
+        for start in range(0, reader.n_frames, chunk):
+            stop = min(start + chunk, reader.n_frames)
+            block = np.empty((stop - start, uc + 3 * (n_atoms + 2)), dtype=reader._xyz.dtype)
+            if uc:
+                block[:, :uc] = reader._words[start:stop, :uc]
+            records = block[:, uc:].reshape(stop - start, 3, n_atoms + 2)
+            records[:, :, 0] = marker
+            records[:, :, -1] = marker
+            records[:, :, 1:-1] = reader._xyz[start:stop, :, selection]
+            f.write(block.tobytes())
+
+
+def write_archive(reader, filename, precision=0.01, chunk_size=100, compression_level=6):
+    """
+    Write a trajectory to a compressed archive read by ArchiveReader.
+    The coordinates are rounded to multiples of precision, so they are reproduced within precision / 2.
+
+    Parameters:
+    reader (SubsetDCDReader or ChainedDCDReader): Reader of the source trajectory, see open_dcd().
+    filename (str): Output archive file (.dcdz).
+    precision (float): Quantization step of the coordinates in Angstrom.
+    chunk_size (int): Number of frames per chunk, the smallest unit decoded by a read.
+    compression_level (int): Deflate level from 1 (fastest) to 9 (smallest).
+
+    Returns:
+    int: Size of the archive in bytes.
+    """
+    if precision <= 0:
+        raise ValueError("The precision must be positive.")
+    i2, i4 = np.iinfo(np.int16), np.iinfo(np.int32)
+
+    chunks = []
+    filename = Path(filename)
+    tmp = filename.with_name(f".{filename.name}.{os.getpid()}.tmp")
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compression_level) as zf:
+        for i, start in enumerate(range(0, reader.n_frames, chunk_size)):
+            stop = min(start + chunk_size, reader.n_frames)
+            quantized = np.rint(reader.positions(slice(None), start, stop).transpose(0, 2, 1) / precision)
+            if np.abs(quantized).max() > i4.max:
+                raise ValueError(f"Coordinates of frames {start}-{stop} exceed the range of precision {precision}.")
+            quantized = quantized.astype(np.int32)
+
+            # Differences between consecutive frames fit in 16 bits unless an atom jumps, e.g. by wrapping
+            delta = np.diff(quantized, axis=0)
+            if delta.size == 0 or (delta.min() >= i2.min and delta.max() <= i2.max):
+                delta = delta.astype(np.int16)
+            with zf.open(f"{i:06d}/first.npy", "w") as f:
+                np.lib.format.write_array(f, quantized[0])
+            with zf.open(f"{i:06d}/delta.npy", "w") as f:
+                np.lib.format.write_array(f, delta)
+            chunks.append([start, stop])
+
+        zf.writestr("index.json", json.dumps({
+            "format": ARCHIVE_FORMAT,
+            "n_atoms": reader.n_atoms,
+            "n_frames": reader.n_frames,
+            "first_step": getattr(reader, "first_step", None),
+            "save_interval": getattr(reader, "save_interval", None),
+            "precision": precision,
+            "chunks": chunks,
+        }, indent=2))
+    os.replace(tmp, filename)
+    return os.path.getsize(filename)
+
+
+def as_slice(indices):
+    """
+    Convert atom indices into a slice when they form a contiguous ascending range.
+
+    Parameters:
+    indices (array-like or slice): 0-based atom indices.
+
+    Returns:
+    slice or numpy.ndarray: A slice for contiguous indices, otherwise the indices as an array.
+    """
+    if isinstance(indices, slice):
+        return indices
+    indices = np.asarray(indices)
+    if indices.size > 0 and np.array_equal(indices, np.arange(indices[0], indices[0] + indices.size)):
+        return slice(int(indices[0]), int(indices[0]) + indices.size)
+    return indices
@@ -0,0 +1,20 @@
+#!/bin/bash -e
+
+# Define input/output directories
+DATA_DIR="/path/to/data_dir"
+ARCHIVE_DIR="/path/to/archive_dir"
+
+# Write the trajectory of each state and seed to an archive of coordinates quantized to 0.01 Angstrom.
+# The step01 scripts read {state}.dcdz in place of {state}.dcd.
+uv run \
+  --with numpy \
+  ./step01_batch.py \
+    --script step00_archive_trajectory \
+    --case kinesin \
+    --case kinesin-no-neckmimic \
+    --state free alf3 \
+    --seeds 1 100 \
+    -- \
+      --dcd "${DATA_DIR}/{case}/{sim}/{state}.dcd" \
+      --out "${ARCHIVE_DIR}/{case}/{sim}/{state}.dcdz" \
+      --precision 0.01
@@ -3,19 +3,47 @@ import MDAnalysis as mda
 import MDAnalysis.analysis.rms
 import numpy as np
 import argparse
+import inspect
 
-def calculate_rmsd(dcd, pdb, target_region, skip_steps=1):
+from cv_cache import CVCache, content_key, key_options
+from dcd_reader import dcd_files, is_frame_index, open_dcd
+import mda_archive  # .dcdzアーカイブのリーダーをMDAnalysisに登録する
+from stage_index import read_stages, stage_rows, write_stage_index
+
+def load_universe(pdb, dcd=None, topologies=None):
+  """
+  dcdをpdbのトポロジーに読み込んだUniverseを返す
+  dcdを省略した場合はpdbの座標を持つUniverseを返す（参照構造用）
+  topologiesに辞書を与えた場合、パース済みのトポロジーを保持して同一プロセス内で再利用する
+  """
+  if topologies is None:
+    return mda.Universe(str(pdb)) if dcd is None else mda.Universe(str(pdb), *dcd_files(dcd))
+
+  key = (str(pdb), dcd is None)
+  if key not in topologies:
+    topologies[key] = mda.Universe(str(pdb))
+  universe = topologies[key]
+  if dcd is not None:
+    # 複数のDCDファイルのフレームインデックスはMDAnalysisのChainReaderで読み込む
+    files = dcd_files(dcd)
+    universe.load_new(files if len(files) > 1 else files[0])
+  return universe
+
+
+def calculate_rmsd(dcd, pdb, target_region, start=None, stop=None, step=None, topologies=None, n_workers=1):
   """
   dcd, itp, pdbから
     * rmsd: pdbで与えられたpdbファイルを基準としてrmsdを計算する
     を返す
-  skip_stepsで指定されたステップ数だけスキップして処理する
+  start, stop, stepで処理するフレームをスライスと同様に指定する。R.runに渡すので、読み飛ばしたフレームは計算しない
+  topologiesはload_universeに渡すトポロジーのキャッシュ
+  n_workers > 1の場合、フレームを連続したブロックに分けてn_workers個のプロセスで計算する
   """
   # Initialize universe
-  universe = mda.Universe(str(pdb), str(dcd))
+  universe = load_universe(pdb, dcd, topologies)
 
   # Initialize calculater instance of RMSD
-  ref = mda.Universe(str(pdb))
+  ref = load_universe(pdb, topologies=topologies)
   R = MDAnalysis.analysis.rms.RMSD(
     universe,
     ref,
@@ -23,26 +51,82 @@ def calculate_rmsd(dcd, pdb, target_region, skip_steps=1):
     groupselections=[target_region]
   )
   ## calculate rmsd
-  R.run(verbose=True)
+  if n_workers > 1:
+    # 各プロセスが自身のリーダーでブロックを処理し、フレーム順に結合される（MDAnalysis >= 2.8）
+    R.run(start=start, stop=stop, step=step, backend="multiprocessing", n_workers=n_workers)
+  else:
+    R.run(start=start, stop=stop, step=step, verbose=True)
   rmsd = R.rmsd[:, 3]
-  rmsd = rmsd[::skip_steps]
   
   return rmsd
 
-def main():
+def get_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument("--target-region", type=str, required=True, help="Selection string for the kinesin dimer")
     parser.add_argument("--pdb", type=str, required=True, help="PDB file for topology")
-    parser.add_argument("--dcd", type=str, required=True, help="DCD file for trajectory")
+    parser.add_argument("--dcd", type=str, required=True, help="DCD file for trajectory, a frame index of several DCD files written by step00_index_trajectory.py, or an archive written by step00_archive_trajectory.py")
     parser.add_argument("--out", type=str, required=True, help="Output file name")
-    args = parser.parse_args()
+    parser.add_argument("--inp-dir", type=str, default=None, help="Directory of the GENESIS inputs (sim*.inp) of the trajectory, to write the stage index of the output")
+    parser.add_argument("--start", type=int, default=None, help="First frame to read")
+    parser.add_argument("--stop", type=int, default=None, help="Frame to stop before")
+    parser.add_argument("--step", type=int, default=None, help="Read every step-th frame")
+    parser.add_argument("--n-workers", type=int, default=1, help="Number of processes sharing the frames of the trajectory")
+    parser.add_argument("--cache-dir", type=str, default=None, help="Directory of the output cache, disabled by default")
+    parser.add_argument("--cache-size", type=float, default=20.0, help="Size limit of the output cache in GB")
+    return parser
 
+
+def write_rmsd(args, topologies=None):
+    """
+    1つのトラジェクトリのrmsdを計算してargs.outに保存する
+    topologiesはload_universeに渡すトポロジーのキャッシュ
+    """
     #Caluculate rmsd
-    rmsd = calculate_rmsd(args.dcd, args.pdb, args.target_region)
+    rmsd = calculate_rmsd(args.dcd, args.pdb, args.target_region, args.start, args.stop, args.step, topologies=topologies, n_workers=args.n_workers)
 
     #Sae dataframe
     df = pd.DataFrame({"rmsd": rmsd})
     df.to_csv(args.out)
 
+def write_stages(args):
+    """
+    args.inp_dirのGENESIS入力ファイルからargs.outのステージインデックスを書き出す（stage_index.py参照）
+    --inp-dirを指定せず--dcdがフレームインデックスの場合は、そのDCDファイルごとのステージを使う
+    どちらでもない場合は何もしない
+    """
+    if args.inp_dir is None and not is_frame_index(args.dcd):
+        return
+    reader = open_dcd(args.dcd)
+    stages = read_stages(args.inp_dir) if args.inp_dir is not None else reader.stages()
+    frames = range(reader.n_frames)[args.start:args.stop:args.step]
+    write_stage_index(args.out, stage_rows(stages, frames))
+
+def run(args, topologies=None):
+    """
+    1つのトラジェクトリのrmsdを計算してargs.outに保存する
+    --cache-dirを指定した場合、同じ入力・オプション・スクリプトで計算済みの出力があればそれをコピーする
+    """
+    if args.cache_dir is None:
+        write_rmsd(args, topologies)
+        write_stages(args)
+        return
+
+    cache = CVCache(args.cache_dir, args.cache_size)
+    # フレームを読むモジュールと出力を書くモジュールも出力のバイト列を変えるのでキーに含める
+    sources = [__file__, *(inspect.getsourcefile(code) for code in (open_dcd, mda_archive, write_stage_index))]
+    key = content_key([*dcd_files(args.dcd), args.pdb], key_options(args), sources)
+    if cache.fetch(key, args.out):
+        print(f"{args.out}: restored from cache")
+        write_stages(args)
+        return
+
+    write_rmsd(args, topologies)
+    write_stages(args)
+    cache.store(key, args.out)
+
+def main():
+    args = get_parser().parse_args()
+    run(args)
+
 if __name__=="__main__":
   main()
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 import argparse
-import pathlib
 import warnings
 
 warnings.filterwarnings("ignore")
@@ -12,21 +11,20 @@ import matplotlib.cm as cm
 
 import numpy as np
 import pandas as pd
-from pathlib import Path
+from cv_ensemble import load_ensemble
 
 plt.rcParams.update({'font.size': 25})
 
-def plot_mean_and_std(df_list, save_path=None):
+def plot_mean_and_std(data, save_path=None):
     """
-    df_list: List of pandas Series or single-column DataFrames
+    data: array of shape (num_samples, num_timesteps), e.g. CVEnsemble.cv()
     save_path: str or Path, optional
         プロット画像の保存先パス。Noneなら保存せず表示だけする。
 
     各時刻における値の平均と標準偏差を計算し、プロットする
     """
     # 全データをnumpy配列に変換
-    arrays = [df.values.flatten() for df in df_list]
-    data = np.vstack(arrays)  # shape: (num_samples, num_timesteps)
+    data = np.asarray(data)  # shape: (num_samples, num_timesteps)
 
     # 平均と標準偏差を計算
     mean = np.mean(data, axis=0)
@@ -96,28 +94,18 @@ def save_mean_std_from_df_list_to_csv(df_list, filename="plot_data.csv", target_
     # CSVとして保存
     df.to_csv(filename, index=False)
 
-def load_rmsd(csv_dir, state="free", average_window=None):
-    # List all the parquet files
-    paths = [str(file) for file in pathlib.Path(csv_dir).rglob(f"{state}.csv")]
-    paths = sorted(paths)
-
-    # Load dataframes
-    df_list = []
-    indexs = []
-    for path in paths:
-        df = pd.read_csv(path)
-
-        #calculate moving average
-        if average_window:
-          df['rmsd'] = df['rmsd'].rolling(window=average_window).mean()
-
-        df_list.append(df["rmsd"])
-        
+def load_rmsd(csv_dir, state="free", average_window=None, dataset=None, cache_dir=None, n_workers=None, verbose=False):
+    # Load the ensemble from the csv files, or from the dataset when csv_dir is a case in it
+    ensemble = load_ensemble(csv_dir, f"{state}.csv", ["rmsd"], dataset, cache_dir=cache_dir, n_workers=n_workers, verbose=verbose)
 
-        indexs.append(np.arange(len(df)))
+    # shape: (num_samples, num_timesteps)
+    data = ensemble.cv("rmsd")
 
+    #calculate moving average
+    if average_window:
+      data = pd.DataFrame(data.T).rolling(window=average_window).mean().to_numpy().T
 
-    return df_list
+    return data
 
 def generate_colors(num_colors, cmap_name='viridis'):
     """
@@ -134,14 +122,18 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--dir", type=str, required=True, help="Directory containing CVs in csv format")
     parser.add_argument("--out", type=str, required=True, help="Output file name")
+    parser.add_argument("--dataset", type=str, required=False, help="Dataset written by step01_build_dataset.py. --dir then names a case in it")
     parser.add_argument("--state", type=str, required=True, help="free or alf3")
+    parser.add_argument("--cache-dir", type=str, required=False, help="Directory of the ensemble cache, disabled by default")
+    parser.add_argument("--n-workers", type=int, required=False, help="Number of threads reading the CV files, see cv_dataset.read_cv_files()")
+    parser.add_argument("--verbose", action="store_true", help="Print the time spent reading each CV file")
     args = parser.parse_args()
 
     
-    df_list = load_rmsd(args.dir, state=args.state, average_window=None)
+    data = load_rmsd(args.dir, state=args.state, average_window=None, dataset=args.dataset, cache_dir=args.cache_dir, n_workers=args.n_workers, verbose=args.verbose)
 
     #Plot Figures
-    plot_mean_and_std(df_list, save_path=args.out)
+    plot_mean_and_std(data, save_path=args.out)
 
 
       
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 import argparse
-import pathlib
 import warnings
 
 warnings.filterwarnings("ignore")
@@ -12,47 +11,44 @@ import matplotlib.cm as cm
 
 import numpy as np
 import pandas as pd
-from pathlib import Path
+from cv_ensemble import load_ensemble
 
 plt.rcParams.update({'font.size': 25})
 
-def plot_mean_and_std(df_list, save_path=None):
+# プロットするステージと、その凡例・色
+STAGE_STYLES = {
+    'sim1': ('Stage 1', '#000080'),
+    'sim2': ('Stage 2', '#00FFFF'),
+    'sim3': ('Stage 3', '#FF0000'),
+}
+
+def plot_mean_and_std(stage_data, save_path=None):
     """
-    df_list: List of pandas Series or single-column DataFrames
+    stage_data: ステージ名から、そのステージの (frames, data) への辞書
+        framesはトラジェクトリ全体でのフレーム番号（CVEnsemble.frames参照）
+        dataは shape: (num_samples, num_timesteps) の配列
     save_path: str or Path, optional
         プロット画像の保存先パス。Noneなら保存せず表示だけする。
     
-    指定された範囲ごとに平均と標準偏差を計算し、別の色でプロットする
+    ステージごとに平均と標準偏差を計算し、別の色でプロットする
+    ステージの範囲はハードコードせず、各出力のステージインデックスから読み込む
     """
-    # 全データをnumpy配列に変換
-    arrays = [df.values.flatten() for df in df_list]
-    data = np.vstack(arrays)  # shape: (num_samples, num_timesteps)
-
-    # 時間軸
-    timesteps = np.arange(data.shape[1])
-
     # プロット
     plt.figure(figsize=(10, 6))
 
-    # --- 各区間ごとにプロット ---
-    sections = {
-        '0-2000': (0, 2000, 'Stage 1'),
-        '2000-2300': (2000, 2300, 'Stage 2'),
-        '2300-22300': (2300, 22300, 'Stage 3')
-    }
-    colors = {
-        '0-2000': '#000080',
-        '2000-2300': '#00FFFF',
-        '2300-22300': '#FF0000'
-    }
-
-    for label, (start, end, stage_name) in sections.items():
-        mean = np.mean(data[:, start:end], axis=0)
-        std = np.std(data[:, start:end], axis=0)
-        time_sec = timesteps[start:end] / 100
-
-        plt.plot(time_sec, mean, label=f"{stage_name}", color=colors[label], lw=2)
-        plt.fill_between(time_sec, mean - std, mean + std, alpha=0.3, color=colors[label])
+    # --- 各ステージごとにプロット ---
+    for stage, (frames, data) in stage_data.items():
+        # 全データをnumpy配列に変換
+        data = np.asarray(data)  # shape: (num_samples, num_timesteps)
+
+        mean = np.mean(data, axis=0)
+        std = np.std(data, axis=0)
+        # 時間軸はトラジェクトリ全体でのフレーム番号
+        time_sec = frames / 100
+
+        stage_name, color = STAGE_STYLES[stage]
+        plt.plot(time_sec, mean, label=f"{stage_name}", color=color, lw=2)
+        plt.fill_between(time_sec, mean - std, mean + std, alpha=0.3, color=color)
 
     #plt.xlabel(r"MD steps ($\times 10^{4}$)")
     plt.ylim(0, 12)
@@ -105,28 +101,19 @@ def save_mean_std_from_df_list_to_csv(df_list, filename="plot_data.csv"):
 
     # CSVとして保存
     df.to_csv(filename, index=False)
-def load_rmsd(csv_dir, average_window=None):
-    # List all the parquet files
-    paths = [str(file) for file in pathlib.Path(csv_dir).rglob(f"*.csv")]
-    paths = sorted(paths)
-
-    # Load dataframes
-    df_list = []
-    indexs = []
-    for path in paths:
-        df = pd.read_csv(path)
-
-        #calculate moving average
-        if average_window:
-          df['rmsd'] = df['rmsd'].rolling(window=average_window).mean()
-
-        df_list.append(df["rmsd"])
-        
+def load_rmsd(csv_dir, average_window=None, dataset=None, stage=None, cache_dir=None, n_workers=None, verbose=False):
+    # Load the ensemble from the csv files, or from the dataset when csv_dir is a case in it
+    # stageを指定した場合はそのステージの行のみ読み込む（移動平均もステージ内で取る）
+    ensemble = load_ensemble(csv_dir, f"*.csv", ["rmsd"], dataset, stage=stage, cache_dir=cache_dir, n_workers=n_workers, verbose=verbose)
 
-        indexs.append(np.arange(len(df)))
+    # shape: (num_samples, num_timesteps)
+    data = ensemble.cv("rmsd")
 
+    #calculate moving average
+    if average_window:
+      data = pd.DataFrame(data.T).rolling(window=average_window).mean().to_numpy().T
 
-    return df_list
+    return ensemble.frames(), data
 
 def generate_colors(num_colors, cmap_name='viridis'):
     """
@@ -143,12 +130,16 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--dir", type=str, required=True, help="Directory containing CVs in csv format")
     parser.add_argument("--out", type=str, required=True, help="Output file name")
+    parser.add_argument("--dataset", type=str, required=False, help="Dataset written by step01_build_dataset.py. --dir then names a case in it")
+    parser.add_argument("--cache-dir", type=str, required=False, help="Directory of the ensemble cache, disabled by default")
+    parser.add_argument("--n-workers", type=int, required=False, help="Number of threads reading the CV files, see cv_dataset.read_cv_files()")
+    parser.add_argument("--verbose", action="store_true", help="Print the time spent reading each CV file")
     args = parser.parse_args()
 
     
-    df_list = load_rmsd(args.dir, average_window=None)
+    stage_data = {stage: load_rmsd(args.dir, average_window=None, dataset=args.dataset, stage=stage, cache_dir=args.cache_dir, n_workers=args.n_workers, verbose=args.verbose) for stage in STAGE_STYLES}
 
-    plot_mean_and_std(df_list, save_path=args.out)
+    plot_mean_and_std(stage_data, save_path=args.out)
 
       
 
@@ -0,0 +1,259 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from cv_ensemble import open_atomic
+
+
+class DensityGrid:
+    """
+    Bivariate kernel density estimate on a grid, with the univariate estimates of both variables.
+
+    The grids and the bandwidths follow seaborn.kdeplot() with its defaults: Gaussian kernels with
+    Scott's rule, the full covariance of the data for the bivariate estimate, and support grids
+    extending cut bandwidths past the data. The univariate estimates are on the same support grids.
+
+    Attributes:
+    x (numpy.ndarray): Support grid of the first variable, of shape (n_x,).
+    y (numpy.ndarray): Support grid of the second variable, of shape (n_y,).
+    density (numpy.ndarray): Bivariate density of shape (n_y, n_x), as plotted by matplotlib contour(x, y, density).
+    x_density (numpy.ndarray): Univariate density of the first variable on x.
+    y_density (numpy.ndarray): Univariate density of the second variable on y.
+    n (int): Number of points.
+    """
+
+    def __init__(self, x, y, density, x_density, y_density, n):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.density = np.asarray(density)
+        self.x_density = np.asarray(x_density)
+        self.y_density = np.asarray(y_density)
+        self.n = int(n)
+
+    def save(self, path):
+        """
+        Save the grids to an .npz file, replaced atomically.
+        """
+        with open_atomic(path) as f:
+            np.savez(f, x=self.x, y=self.y, density=self.density, x_density=self.x_density,
+                     y_density=self.y_density, n=self.n)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load grids saved by save().
+        """
+        with np.load(path) as f:
+            return cls(**{name: f[name] for name in f.files})
+
+    def levels(self, levels=10, thresh=0.05):
+        """
+        Density levels of the iso-proportion contours drawn by seaborn.kdeplot(), see iso_proportion_levels().
+        """
+        return iso_proportion_levels(self.density, levels, thresh)
+
+
+def scott_factor(n, d):
+    """
+    Bandwidth factor of Scott's rule, as scipy.stats.gaussian_kde(bw_method="scott").
+    """
+    return n ** (-1.0 / (d + 4))
+
+
+def support_grid(x, bw, cut, gridsize):
+    """
+    Evaluation grid of seaborn.kdeplot(): gridsize points from cut bandwidths below to above the data.
+    """
+    return np.linspace(x.min() - bw * cut, x.max() + bw * cut, gridsize)
+
+
+def linear_binning(x, y, grid_x, grid_y):
+    """
+    Counts of points on the nodes of a regular grid, each point being shared among the four surrounding
+    nodes in proportion to its proximity to them.
+
+    Parameters:
+    x, y (numpy.ndarray): Coordinates of the points, within the grids.
+    grid_x, grid_y (numpy.ndarray): Evenly spaced nodes of each axis.
+
+    Returns:
+    numpy.ndarray: Counts of shape (len(grid_y), len(grid_x)), summing to the number of points.
+    """
+    nx, ny = len(grid_x), len(grid_y)
+    fx = np.clip((x - grid_x[0]) / (grid_x[1] - grid_x[0]), 0, nx - 1)
+    fy = np.clip((y - grid_y[0]) / (grid_y[1] - grid_y[0]), 0, ny - 1)
+    ix = np.minimum(fx.astype(np.int64), nx - 2)
+    iy = np.minimum(fy.astype(np.int64), ny - 2)
+    wx, wy = fx - ix, fy - iy
+
+    counts = np.zeros(nx * ny)
+    for dy, weight_y in ((0, 1 - wy), (1, wy)):
+        for dx, weight_x in ((0, 1 - wx), (1, wx)):
+            counts += np.bincount((iy + dy) * nx + ix + dx, weights=weight_y * weight_x, minlength=nx * ny)
+    return counts.reshape(ny, nx)
+
+
+def _fft_convolve(counts, kernel):
+    """
+    Convolution of counts with a centred kernel of odd size, cropped to the shape of counts.
+    """
+    shape = [n + k - 1 for n, k in zip(counts.shape, kernel.shape)]
+    result = np.fft.irfftn(np.fft.rfftn(counts, shape) * np.fft.rfftn(kernel, shape), shape)
+    crop = tuple(slice(k // 2, k // 2 + n) for n, k in zip(counts.shape, kernel.shape))
+    return result[crop]
+
+
+def _kernel_offsets(step, sigma, n_max, truncate=4.0):
+    """
+    Offsets of the grid nodes within truncate standard deviations, at most n_max nodes on each side.
+    """
+    half = int(min(n_max, np.ceil(truncate * sigma / step)))
+    return np.arange(-half, half + 1) * step
+
+
+def _gaussian_1d(counts, step, bw):
+    offsets = _kernel_offsets(step, bw, len(counts) - 1)
+    kernel = np.exp(-0.5 * (offsets / bw) ** 2) / (np.sqrt(2 * np.pi) * bw)
+    return _fft_convolve(counts, kernel)
+
+
+def kde_grid(x, y, gridsize=200, cut=3, bw_adjust=1, oversample=None):
+    """
+    Binned kernel density estimate of seaborn.kdeplot(x=x, y=y) and of its two marginals.
+
+    Instead of summing the kernels of all points at every node, the points are binned once on a grid
+    with linear binning and the counts are convolved with the kernel by FFT, so the cost is
+    O(N + G^2 log G) for N points on a G x G grid instead of O(N G^2). The marginals are estimated from
+    the sums of the same counts over each axis. The binning error is kept small by binning on a grid
+    oversample times finer than the support grid and taking every oversample-th node. With the default
+    oversample, the densities agree with scipy.stats.gaussian_kde to within 0.2% of their peak, and
+    mostly within 0.1%, from 5 to 100000 points including strongly correlated ones.
+
+    Parameters:
+    x, y (array-like): Coordinates of the points, e.g. theta and phi.
+    gridsize (int): Number of nodes of each support grid.
+    cut (float): Extent of the support grids past the data, in bandwidths.
+    bw_adjust (float): Factor scaling the bandwidths of Scott's rule.
+    oversample (int, optional): Refinement of the binning grid. Defaults to a node spacing of at most an
+        eighth of the smallest kernel width along each axis, up to 8.
+
+    Returns:
+    DensityGrid: Densities on the support grids.
+
+    Raises:
+    ValueError: If there are fewer than 2 points, or they have zero variance or lie on a line.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n < 2:
+        raise ValueError(f"A kernel density estimate needs at least 2 points, got {n}.")
+
+    # A constant variable or points on a line have no density, where seaborn.kdeplot() warns and draws nothing
+    data_covariance = np.cov(x, y)
+    variances = np.diag(data_covariance)
+    if not np.all(variances > 0) or np.linalg.det(data_covariance) <= np.finfo(np.float64).eps * variances.prod():
+        raise ValueError(f"The {n} points have zero variance or lie on a line, so their density cannot be estimated.")
+
+    # Bandwidths: full covariance for the bivariate estimate, standard deviations for the marginals
+    covariance = data_covariance * (scott_factor(n, 2) * bw_adjust) ** 2
+    bw_1d = np.sqrt(variances) * scott_factor(n, 1) * bw_adjust
+    bw_2d = np.sqrt(np.diag(covariance))
+    precision = np.linalg.inv(covariance)
+    grid_x = support_grid(x, bw_2d[0], cut, gridsize)
+    grid_y = support_grid(y, bw_2d[1], cut, gridsize)
+
+    # Bin on a finer grid whose every oversample-th node is a node of the support grid. The curvature of
+    # a correlated kernel along each axis is set by its width at a fixed value of the other variable,
+    # 1 / sqrt(precision), which is narrower than the marginal bandwidth.
+    steps = np.array([grid_x[1] - grid_x[0], grid_y[1] - grid_y[0]])
+    if oversample is None:
+        widths = np.minimum(bw_1d, 1 / np.sqrt(np.diag(precision)))
+        oversample = int(np.clip(np.ceil(8 * np.max(steps / widths)), 1, 8))
+    fine_x = np.linspace(grid_x[0], grid_x[-1], (gridsize - 1) * oversample + 1)
+    fine_y = np.linspace(grid_y[0], grid_y[-1], (gridsize - 1) * oversample + 1)
+    step_x, step_y = steps / oversample
+    counts = linear_binning(x, y, fine_x, fine_y)
+
+    # Bivariate Gaussian kernel on the node offsets, with the covariance of the data
+    offsets_x = _kernel_offsets(step_x, bw_2d[0], len(fine_x) - 1)
+    offsets_y = _kernel_offsets(step_y, bw_2d[1], len(fine_y) - 1)
+    dx, dy = np.meshgrid(offsets_x, offsets_y)
+    exponent = precision[0, 0] * dx**2 + 2 * precision[0, 1] * dx * dy + precision[1, 1] * dy**2
+    kernel = np.exp(-0.5 * exponent) / (2 * np.pi * np.sqrt(np.linalg.det(covariance)))
+
+    density = _fft_convolve(counts, kernel) / n
+    x_density = _gaussian_1d(counts.sum(axis=0), step_x, bw_1d[0]) / n
+    y_density = _gaussian_1d(counts.sum(axis=1), step_y, bw_1d[1]) / n
+
+    # FFT round-off may leave tiny negative densities far from the data
+    sub = slice(None, None, oversample)
+    return DensityGrid(grid_x, grid_y, np.maximum(density[sub, sub], 0),
+                       np.maximum(x_density[sub], 0), np.maximum(y_density[sub], 0), n)
+
+
+def iso_proportion_levels(density, levels=10, thresh=0.05):
+    """
+    Density levels of the contours of seaborn.kdeplot(): the contour of proportion p encloses the
+    highest densities holding 1 - p of the mass, for levels proportions from thresh to 1.
+
+    Parameters:
+    density (numpy.ndarray): Density grid, see DensityGrid.density.
+    levels (int): Number of contours.
+    thresh (float): Proportion of the mass outside the lowest contour.
+
+    Returns:
+    numpy.ndarray: Increasing density levels.
+    """
+    values = np.sort(np.ravel(density))[::-1]
+    proportions = np.cumsum(values) / values.sum()
+    index = np.searchsorted(proportions, 1 - np.linspace(thresh, 1, levels))
+    return np.take(values, index, mode="clip")
+
+
+def kde_key(x, y, **options):
+    """
+    Key of a density estimate in the cache of cached_kde_grid(): a hash of the points, the options and
+    the source of this module.
+
+    Returns:
+    str: Hexadecimal key.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for values in (x, y):
+        h.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        h.update(b"\0")
+    h.update(json.dumps(options, sort_keys=True).encode())
+    h.update(Path(__file__).read_bytes())
+    return h.hexdigest()
+
+
+def cached_kde_grid(x, y, cache_dir=None, verbose=False, **options):
+    """
+    kde_grid() with its grids kept in cache_dir, so that a figure can be restyled without
+    estimating the densities again.
+
+    Parameters:
+    x, y (array-like): Coordinates of the points.
+    cache_dir (str, optional): Directory of the cache, e.g. that of the ensembles. Disabled by default.
+    verbose (bool): Whether to print the cache file restored.
+    options: Keyword arguments of kde_grid().
+
+    Returns:
+    DensityGrid: Densities on the support grids.
+    """
+    if cache_dir is None:
+        return kde_grid(x, y, **options)
+
+    path = Path(cache_dir) / f"kde-{kde_key(x, y, **options)}.npz"
+    if path.exists():
+        if verbose:
+            print(f"KDE restored from {path}")
+        return DensityGrid.load(path)
+
+    grid = kde_grid(x, y, **options)
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    grid.save(path)
+    return grid
@@ -0,0 +1,285 @@
+import hashlib
+import inspect
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cv_dataset import iter_cv_items
+from stage_index import stage_index_path
+
+
+class CVEnsemble:
+    """
+    CVs of an ensemble of trajectories as one array of shape (n_seeds, n_frames, n_cvs).
+
+    The trajectories of all seeds and cases are stacked once, so the step02 scripts take the CVs of
+    the whole ensemble as array views instead of stacking per-seed DataFrames. Frames after the end
+    of a shorter trajectory are NaN. An ensemble saved by save() is reopened memory-mapped by load().
+
+    Attributes:
+    values (numpy.ndarray): CVs of shape (n_seeds, n_frames, n_cvs).
+    columns (list of str): Name of each CV.
+    seeds (numpy.ndarray): Seed of each trajectory, -1 for files outside a sim-NNNN directory.
+    states (numpy.ndarray): State of each trajectory, e.g. free or trajectory.
+    cases (numpy.ndarray): Case of each trajectory, e.g. kinesin.
+    lengths (numpy.ndarray): Number of frames of each trajectory.
+    starts (numpy.ndarray): Frame of the first row of each trajectory, e.g. the first frame of a stage.
+    """
+
+    def __init__(self, values, columns, seeds, states, cases, lengths, starts):
+        self.values = values
+        self.columns = list(columns)
+        self.seeds = np.asarray(seeds, dtype=np.int64)
+        self.states = np.asarray(states, dtype=str)
+        self.cases = np.asarray(cases, dtype=str)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int64)
+
+    @classmethod
+    def from_tables(cls, tables, columns, dtype=np.float64):
+        """
+        Stack per-seed tables.
+
+        Parameters:
+        tables (iterable of tuple): (case, seed, state, df) of each trajectory. The index of df is the frame.
+        columns (list of str): CV columns to stack.
+        dtype (numpy.dtype): Type of the array.
+
+        Returns:
+        CVEnsemble: Ensemble of the tables in the given order.
+        """
+        cases, seeds, states, arrays, starts = [], [], [], [], []
+        for case, seed, state, df in tables:
+            cases.append(case)
+            seeds.append(-1 if seed is None else seed)
+            states.append(state)
+            arrays.append(df[columns].to_numpy(dtype))
+            starts.append(df.index[0] if len(df) > 0 else 0)
+
+        lengths = [len(array) for array in arrays]
+        values = np.full((len(arrays), max(lengths, default=0), len(columns)), np.nan, dtype=dtype)
+        for i, array in enumerate(arrays):
+            values[i, :len(array)] = array
+        return cls(values, columns, seeds, states, cases, lengths, starts)
+
+    def __len__(self):
+        return len(self.values)
+
+    def cv(self, name):
+        """
+        One CV of all the trajectories as a view of shape (n_seeds, n_frames).
+        """
+        return self.values[:, :, self.columns.index(name)]
+
+    def frames(self, i=0):
+        """
+        Frames of the rows of a trajectory, e.g. for the time axis of a stage.
+        """
+        return self.starts[i] + np.arange(self.values.shape[1])
+
+    def select(self, mask):
+        """
+        Trajectories selected by a mask, e.g. ensemble.cases == "kinesin".
+        Consecutive trajectories, such as those of one case, are returned as views.
+
+        Parameters:
+        mask (array-like of bool): Whether to keep each trajectory.
+
+        Returns:
+        CVEnsemble: Ensemble of the selected trajectories.
+        """
+        indices = np.flatnonzero(mask)
+        if len(indices) > 0 and indices[-1] - indices[0] + 1 == len(indices):
+            indices = slice(indices[0], indices[-1] + 1)
+        return CVEnsemble(self.values[indices], self.columns, self.seeds[indices], self.states[indices],
+                          self.cases[indices], self.lengths[indices], self.starts[indices])
+
+    def tables(self):
+        """
+        Iterate over the trajectories as DataFrames indexed by frame, as yielded by cv_dataset.iter_cv_tables().
+        """
+        for i in range(len(self)):
+            index = pd.RangeIndex(self.starts[i], self.starts[i] + self.lengths[i])
+            yield pd.DataFrame(self.values[i, :self.lengths[i]], index=index, columns=self.columns)
+
+    def save(self, path):
+        """
+        Save the ensemble to path.npy and its metadata to path.json. Both files are replaced atomically,
+        and the metadata is written last, so an ensemble with metadata is complete.
+
+        Parameters:
+        path (str): Path of the files without suffix.
+        """
+        path = Path(path)
+        metadata = {
+            "columns": self.columns,
+            "seeds": self.seeds.tolist(),
+            "states": self.states.tolist(),
+            "cases": self.cases.tolist(),
+            "lengths": self.lengths.tolist(),
+            "starts": self.starts.tolist(),
+        }
+        with open_atomic(path.with_name(path.name + ".npy")) as f:
+            np.save(f, self.values)
+        with open_atomic(path.with_name(path.name + ".json")) as f:
+            f.write(json.dumps(metadata).encode())
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Load an ensemble saved by save().
+
+        Parameters:
+        path (str): Path of the files without suffix.
+        mmap_mode (str or None): Memory-map mode of numpy.load(). The default maps the array read-only
+            without reading it, and None reads it into memory.
+
+        Returns:
+        CVEnsemble: Saved ensemble.
+        """
+        path = Path(path)
+        metadata = json.loads(path.with_name(path.name + ".json").read_text())
+        values = np.load(path.with_name(path.name + ".npy"), mmap_mode=mmap_mode)
+        return cls(values, **metadata)
+
+
+@contextmanager
+def open_atomic(filename):
+    """
+    Open a file for binary writing so that readers never see it partially written.
+    The file is replaced when the block exits without an exception.
+    """
+    filename = Path(filename)
+    tmp = filename.with_name(f".{filename.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            yield f
+        os.replace(tmp, filename)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def source_files(source, pattern, dataset=None):
+    """
+    Files read for one case by cv_dataset.iter_cv_items(): the per-seed files and their stage indexes,
+    or the partitions of the case in a dataset.
+
+    Parameters:
+    source (str): Directory of the per-seed files, or the case in dataset.
+    pattern (str): File name pattern of the per-seed files.
+    dataset (str, optional): Dataset written by cv_dataset.write_dataset().
+
+    Returns:
+    list of Path: Existing files.
+    """
+    if dataset is not None:
+        return sorted((Path(dataset) / f"case={source}").rglob("*.parquet"))
+    files = []
+    for path in sorted(Path(source).rglob(pattern)):
+        files.append(path)
+        if stage_index_path(path).exists():
+            files.append(stage_index_path(path))
+    return files
+
+
+def ensemble_key(sources, pattern, dataset=None, columns=None, stage=None, convert=None):
+    """
+    Key of an ensemble in the cache of load_ensemble().
+
+    The key covers the path, size and modification time of every file read, so it is computed from
+    directory listings alone and changes whenever a step01 output is rewritten.
+
+    Returns:
+    str: Hexadecimal key.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for source in sources:
+        for path in source_files(source, pattern, dataset):
+            stat = path.stat()
+            h.update(f"{path.resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    options = {"pattern": pattern, "dataset": dataset is not None, "columns": columns, "stage": stage,
+               "convert": None if convert is None else inspect.getsource(convert)}
+    h.update(json.dumps(options, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def load_ensemble(sources, pattern, columns, dataset=None, stage=None, cache_dir=None, convert=None, n_workers=None, verbose=False):
+    """
+    Load the CVs of the trajectories of one or more cases as a CVEnsemble.
+
+    With cache_dir, the ensemble is saved there on the first load and reopened memory-mapped on
+    later loads with the same files and options, without reading the files.
+
+    Parameters:
+    sources (str or list of str): Directories of the per-seed files, or cases in dataset. The directory
+        name is the case of its trajectories.
+    pattern (str): File name pattern of the per-seed files, e.g. "*.parquet" or "free.csv".
+    columns (list of str): CV columns to stack.
+    dataset (str, optional): Dataset written by cv_dataset.write_dataset().
+    stage (str, optional): Stage, e.g. "sim3". Defaults to all frames.
+    cache_dir (str, optional): Directory of the ensemble cache. Disabled by default.
+    convert (callable, optional): Function applied to each table before stacking, e.g. to expand
+        dict-valued columns into the requested columns. All the columns are then read and columns
+        selects from its output. Its source code is part of the cache key.
+    n_workers (int, optional): Number of threads reading the files, see cv_dataset.read_cv_files().
+    verbose (bool): Whether to print the time spent reading each file.
+
+    Returns:
+    CVEnsemble: Trajectories in the order of the sources and then of iter_cv_items().
+    """
+    sources = [sources] if isinstance(sources, (str, Path)) else list(sources)
+    if cache_dir is not None:
+        path = Path(cache_dir) / ensemble_key(sources, pattern, dataset, columns, stage, convert)
+        if path.with_name(path.name + ".json").exists():
+            if verbose:
+                print(f"{', '.join(map(str, sources))}: restored from {path}.npy")
+            return CVEnsemble.load(path)
+
+    def tables():
+        for source in sources:
+            if convert is None:
+                for seed, state, df in iter_cv_items(source, pattern, dataset, columns, stage, n_workers, verbose):
+                    yield Path(source).name, seed, state, df
+            else:
+                for seed, state, df in iter_cv_items(source, pattern, dataset, stage=stage, n_workers=n_workers, verbose=verbose):
+                    yield Path(source).name, seed, state, convert(df)
+
+    ensemble = CVEnsemble.from_tables(tables(), columns)
+    if cache_dir is None:
+        return ensemble
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    ensemble.save(path)
+    return CVEnsemble.load(path)
+
+
+def iter_cv(sources, pattern, name, dataset=None, stage=None, cache_dir=None, n_workers=None, verbose=False):
+    """
+    Iterate over one CV of the trajectories of one or more cases one seed at a time, e.g. to accumulate
+    per-timestep statistics without stacking the ensemble.
+
+    Without cache_dir the files are streamed by cv_dataset.iter_cv_items(), and only the files read ahead
+    are in memory. A case in a dataset is read in one scan. With cache_dir the rows of the memory-mapped
+    ensemble of load_ensemble() are yielded, which is built in memory once on the first load.
+
+    Parameters:
+    sources (str or list of str): Directories of the per-seed files, or cases in dataset.
+    pattern (str): File name pattern of the per-seed files, e.g. "free.csv".
+    name (str): CV column, e.g. "stalk_rmsd".
+    dataset, stage, cache_dir, n_workers, verbose: See load_ensemble().
+
+    Yields:
+    numpy.ndarray: CV of one trajectory of shape (n_frames,), in the order of load_ensemble().
+    """
+    sources = [sources] if isinstance(sources, (str, Path)) else list(sources)
+    if cache_dir is not None:
+        ensemble = load_ensemble(sources, pattern, [name], dataset, stage, cache_dir, n_workers=n_workers, verbose=verbose)
+        for row, length in zip(ensemble.cv(name), ensemble.lengths):
+            yield row[:length]
+        return
+    for source in sources:
+        for _, _, df in iter_cv_items(source, pattern, dataset, [name], stage, n_workers, verbose):
+            yield df[name].to_numpy(np.float64)
@@ -0,0 +1,41 @@
+from MDAnalysis.coordinates.base import ReaderBase
+
+from dcd_reader import ArchiveReader
+
+
+class DCDZReader(ReaderBase):
+    """
+    MDAnalysis reader of the trajectory archives written by dcd_reader.write_archive().
+
+    Readers register their format with MDAnalysis when the class is defined, so importing this
+    module lets mda.Universe() and Universe.load_new() read a .dcdz archive like a DCD file.
+    Frames are decoded through dcd_reader.ArchiveReader, which keeps the current chunk decoded
+    while the frames are iterated.
+    """
+
+    format = "DCDZ"
+    units = {"time": "ps", "length": "Angstrom"}
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self._archive = ArchiveReader(self.filename)
+        self.n_atoms = self._archive.n_atoms
+        self.n_frames = self._archive.n_frames
+        self.ts = self._Timestep(self.n_atoms, **self._ts_kwargs)
+        self._read_frame(0)
+
+    def _read_frame(self, frame):
+        self.ts.frame = frame
+        self.ts.positions = self._archive.positions(slice(None), frame, frame + 1)[0]
+        return self.ts
+
+    def _read_next_timestep(self, ts=None):
+        if self.ts.frame + 1 >= self.n_frames:
+            raise EOFError(f"{self.filename} has no more frames.")
+        return self._read_frame(self.ts.frame + 1)
+
+    def _reopen(self):
+        self.ts.frame = -1
+
+    def close(self):
+        pass
@@ -0,0 +1,16 @@
+#!/bin/bash -e
+
+# Define input directory
+DATA_DIR="/path/to/data_dir"
+
+# Index the frames of the DCD files of the switching runs of each seed.
+# The step01 scripts read trajectory.npz in place of a concatenated trajectory.dcd.
+uv run \
+  --with numpy \
+  ./step01_batch.py \
+    --script step00_index_trajectory \
+    --case kinesin \
+    --seeds 1 100 \
+    -- \
+      --dcd "${DATA_DIR}/{case}/{sim}/sim1.dcd" "${DATA_DIR}/{case}/{sim}/sim2.dcd" "${DATA_DIR}/{case}/{sim}/sim3.dcd" \
+      --out "${DATA_DIR}/{case}/{sim}/trajectory.npz"
@@ -0,0 +1,18 @@
+#!/bin/bash -e
+
+# Define input/output directories
+DATA_DIR="/path/to/data_dir"
+DATASET_DIR="/path/to/dataset_dir"
+
+# Merge the per-seed step01 outputs into one Parquet dataset partitioned by
+# case, state and stage. The equilibrium runs are kept in one stage.
+# Pass --dataset "${DATASET_DIR}" to step02 to read it.
+uv run \
+  --with numpy \
+  --with pandas \
+  --with pyarrow \
+  ./step01_build_dataset.py \
+    --dirs "${DATA_DIR}/kinesin.equiliblium" "${DATA_DIR}/kinesin-no-neckmimic.equiliblium" \
+    --pattern "*.parquet" \
+    --out "${DATASET_DIR}" \
+    --no-stages
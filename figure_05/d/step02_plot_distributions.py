@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 import argparse
-import pathlib
 import warnings
 import seaborn as sns
 from pathlib import Path
@@ -17,6 +16,8 @@ import pandas as pd
 import matplotlib.ticker as ticker
 
 from color_config import Color
+from binned_kde import cached_kde_grid
+from cv_ensemble import load_ensemble
 
 
 plt.rcParams["font.family"] = "sans-serif"
@@ -24,14 +25,17 @@ plt.rcParams["font.sans-serif"] = ["Arial", "DejaVu Sans", "Liberation Sans"]
 
 sns.set(font="sans-serif")  # Seaborn の場合
 
-def plot_2d_kde_with_marginals(df_x: pd.DataFrame, df_y: pd.DataFrame, save_path: str):
+def plot_2d_kde_with_marginals(df_x: pd.DataFrame, df_y: pd.DataFrame, save_path: str, cache_dir: str = None, verbose: bool = False):
     """
     2つのデータフレームを使って2次元KDEプロットを作成し、それぞれの軸に1次元のKDEを追加する。
+    KDEはsns.kdeplotと同じバンド幅・グリッド・等高線レベルで、binned_kde.pyのビニング+FFT畳み込みで計算する。
 
     Parameters:
     df_x (pd.DataFrame): X軸とY軸のデータを含むデータフレーム（カラム: 'theta', 'phi'）
     df_y (pd.DataFrame): X軸とY軸のデータを含むデータフレーム（カラム: 'theta', 'phi'）
     save_path (str): 画像の保存パス
+    cache_dir (str): KDEグリッドのキャッシュ先。指定すると2回目以降は再計算せずに描画だけする
+    verbose (bool): キャッシュから復元したファイルを表示する
     """
     #setup colors
     colors = Color()
@@ -40,14 +44,25 @@ def plot_2d_kde_with_marginals(df_x: pd.DataFrame, df_y: pd.DataFrame, save_path
     df_x = df_x[['theta', 'phi']].copy().apply(pd.to_numeric, errors='coerce').replace([np.inf, -np.inf], np.nan).dropna()
     df_y = df_y[['theta', 'phi']].copy().apply(pd.to_numeric, errors='coerce').replace([np.inf, -np.inf], np.nan).dropna()
 
+    # 2次元KDEと周辺分布を同じビニング済みグリッドから計算する（キャッシュがあれば読み込む）
+    # 分散が0または直線上に並ぶデータは密度を推定できないので、sns.kdeplotと同じくそのケースは描かない
+    kdes = []
+    for df, color in ((df_x, colors.without_neckmimic), (df_y, colors.with_neckmimic)):
+        try:
+            kdes.append((cached_kde_grid(df["theta"], df["phi"], cache_dir=cache_dir, verbose=verbose), color))
+        except ValueError as e:
+            print(f"{save_path}: {e} Skipping its density estimate.")
+
     # 図のセットアップ
     fig = plt.figure(figsize=(8, 8))
     grid = plt.GridSpec(6, 6, hspace=0.1, wspace=0.1)
 
-    # メインの 2D KDE プロット
+    # メインの 2D KDE プロット（sns.kdeplotと同じく質量の割合で等高線を引く）
     ax_main = fig.add_subplot(grid[1:, :-1])
-    sns.kdeplot(x=df_x["theta"], y=df_x["phi"], color=colors.without_neckmimic, fill=False, ax=ax_main, thresh=.002, linewidth=2.0)
-    sns.kdeplot(x=df_y["theta"], y=df_y["phi"], color=colors.with_neckmimic, fill=False, ax=ax_main, thresh=.002, linewidth=2.0)
+    for kde, color in kdes:
+        ax_main.contour(kde.x, kde.y, kde.density, levels=kde.levels(thresh=.002), colors=[color], linewidths=2.0)
+    ax_main.set_xlabel("theta")
+    ax_main.set_ylabel("phi")
     ax_main.set_xlim(1, 3)
     ax_main.set_ylim(0, 6)
 
@@ -60,8 +75,9 @@ def plot_2d_kde_with_marginals(df_x: pd.DataFrame, df_y: pd.DataFrame, save_path
 
     # X軸の1次元分布 (上部)
     ax_xdist = fig.add_subplot(grid[0, :-1], sharex=ax_main)
-    sns.kdeplot(x=df_x["theta"], ax=ax_xdist, fill=False, lw=2, color=colors.without_neckmimic, thresh=.002)
-    sns.kdeplot(x=df_y["theta"], ax=ax_xdist, fill=False, lw=2, color=colors.with_neckmimic, thresh=.002)
+    for kde, color in kdes:
+        ax_xdist.plot(kde.x, kde.x_density, lw=2, color=color)
+    ax_xdist.set_ylim(bottom=0)
     ax_xdist.tick_params(axis="both", which="both", bottom=False, left=False, labelbottom=False, labelleft=False)
     ax_xdist.set_xlabel("")
     ax_xdist.set_ylabel("")
@@ -70,8 +86,9 @@ def plot_2d_kde_with_marginals(df_x: pd.DataFrame, df_y: pd.DataFrame, save_path
 
     # Y軸の1次元分布 (右側)
     ax_ydist = fig.add_subplot(grid[1:, -1], sharey=ax_main)
-    sns.kdeplot(y=df_x["phi"], ax=ax_ydist, fill=False, lw=2, color=colors.without_neckmimic, thresh=.002)
-    sns.kdeplot(y=df_y["phi"], ax=ax_ydist, fill=False, lw=2, color=colors.with_neckmimic, thresh=.002)
+    for kde, color in kdes:
+        ax_ydist.plot(kde.y_density, kde.y, lw=2, color=color)
+    ax_ydist.set_xlim(left=0)
     ax_ydist.tick_params(axis="both", which="both", bottom=False, left=False, labelbottom=False, labelleft=False)
     ax_ydist.set_xlabel("")
     ax_ydist.set_ylabel("")
@@ -112,29 +129,23 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--dirs", nargs='+', type=str, required=True, help="Directory containing CVs in parquet format")
     parser.add_argument("--out_dir", type=str, required=True, help="Output file name")
+    parser.add_argument("--dataset", type=str, required=False, help="Dataset written by step01_build_dataset.py. --dirs then name cases in it")
     parser.add_argument("--state", type=str, required=True, help="free or alf3 state")
+    parser.add_argument("--cache-dir", type=str, required=False, help="Directory of the ensemble and KDE caches, disabled by default")
+    parser.add_argument("--n-workers", type=int, required=False, help="Number of threads reading the CV files, see cv_dataset.read_cv_files()")
+    parser.add_argument("--verbose", action="store_true", help="Print the time spent reading each CV file")
     args = parser.parse_args()
 
     all_data_list = []
     x_min, x_max, y_min, y_max = 0,0,0,0
     # dirごとにdistributionをプロットする
     for i,dirname in enumerate(args.dirs):
-      # List all the parquet files
-      paths = [str(file) for file in pathlib.Path(dirname).rglob(f"{args.state}.csv")]
-      paths = sorted(paths)
-
       # Load dataframes
       df_list = []
       indexs = []
-      for path in paths:
-          df = pd.read_csv(path)
-
-          ## Split trajectory
-          sim1 = df.iloc[:2000]
-          sim2 = df.iloc[2000:2300]
-          sim3 = df.iloc[2300:22300]
-          sim4 = df.iloc[22300:22600]
-          sim5 = df.iloc[22600:42600]
+      # List all the csv files, or the trajectories of the case in the dataset
+      ensemble = load_ensemble(dirname, f"{args.state}.csv", ["theta", "phi"], args.dataset, cache_dir=args.cache_dir, n_workers=args.n_workers, verbose=args.verbose)
+      for df in ensemble.tables():
 
           # Unwrap angles
           df = unwrap_angles(df)
@@ -175,6 +186,8 @@ def main():
       sampled_data[sampled_data['case'] == "kinesin-no-neckmimic.equiliblium"], 
       sampled_data[sampled_data['case'] == "kinesin.equiliblium"], 
       str(Path(args.out_dir) / filename),
+      cache_dir=args.cache_dir,
+      verbose=args.verbose,
       )
 
 
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+import argparse
+from pathlib import Path
+
+from dcd_reader import ChainedDCDReader
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Write a frame index of the DCD files of consecutive runs")
+    parser.add_argument("--dcd", type=str, nargs="+", required=True, help="DCD files in the order of the runs, e.g. sim1.dcd sim2.dcd sim3.dcd")
+    parser.add_argument("--stages", type=str, nargs="+", default=None, help="Stage of each DCD file. Defaults to the file stems")
+    parser.add_argument("--out", type=str, required=True, help="Output index file name (.npz)")
+    return parser
+
+
+def run(args, topologies=None):
+    """
+    Index the frames of the DCD files of one simulation.
+    The index is given as --dcd to the step01 scripts in place of a concatenated DCD file.
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    topologies (dict, optional): Unused, accepted for step01_batch.py.
+    """
+    if Path(args.out).suffix != ".npz":
+        raise ValueError(f"{args.out} must have the .npz suffix to be recognized as a frame index.")
+
+    reader = ChainedDCDReader(args.dcd, args.stages)
+    reader.save(args.out)
+    stages = ", ".join(f"{name} {stop - start}" for name, (start, stop) in reader.stages().items())
+    print(f"{args.out}: {reader.n_frames} frames ({stages})")
+
+
+def main():
+    args = get_parser().parse_args()
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,29 @@
 #!/bin/bash -e
 
-# Process all the simulation runs
-for i in {1..100}; do
-  # Define simulation directory
-  SIMU_DIR=$(printf "sim-%04d" "${i}")
+# Define input/output directories
+OUT_DIR="/path/to/out_dir"
+DATA_DIR="/path/to/data_dir"
 
-  # Create output directory
-  mkdir -p /path/to/out_dir
-
-  # Process trajectory if output does not exist
-  if [ ! -e /path/to/out_dir/trajectory.parquet ]; then
-    uv run \
-      --with numpy \
-      --with polars \
-      --with MDAnalysis \
-        ./step01_write_cv.py \
-          --sel-stalk1 "resid 7516-7568" \
-          --sel-stalk2 "resid 7899-7951" \
-          --sel-msu1 "resid 836-1252" \
-          --sel-msu2 "resid 2506-2922" \
-          --sel-msu3 "resid 4593-5010" \
-          --dcd /path/to/trajectory.dcd \
-          --pdb /path/to/free.pdb \
-          --itp /path/to/alf3.itp \
-          --out /path/to/out_dir/trajectory.parquet
-  fi
-done
+# Process all the simulation runs in one pool of worker processes (one per core by default)
+# Trajectories whose DCD is missing or whose output already exists are skipped.
+uv run \
+  --with numpy \
+  --with polars \
+  --with pyarrow \
+  --with MDAnalysis \
+  ./step01_batch.py \
+    --script step01_write_cv \
+    --case kinesin \
+    --seeds 1 100 \
+    -- \
+      --sel-stalk1 "resid 7516-7568" \
+      --sel-stalk2 "resid 7899-7951" \
+      --sel-msu1 "resid 836-1252" \
+      --sel-msu2 "resid 2506-2922" \
+      --sel-msu3 "resid 4593-5010" \
+      --dcd "${DATA_DIR}/{case}/{sim}/trajectory.dcd" \
+      --pdb "${DATA_DIR}/{case}/pdb/free.pdb" \
+      --itp "${DATA_DIR}/{case}/top/alf3.itp" \
+      --inp-dir "${DATA_DIR}/{case}/inp" \
+      --out "${OUT_DIR}/{case}/{sim}/trajectory.parquet"
 exit
-
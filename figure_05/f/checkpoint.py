@@ -0,0 +1,72 @@
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+
+class Checkpoint:
+    """
+    Directory holding the partial results of one step01 run.
+
+    Each result is written atomically once it is complete, so a run that is killed leaves only
+    complete results behind, and a restarted run loads them instead of recomputing them. The
+    directory must be specific to the inputs and options of the run, e.g. named after
+    cv_cache.content_key(), so that results of another trajectory are never mixed in.
+
+    Attributes:
+    directory (Path): Checkpoint directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, name):
+        return self.directory / f"{name}.pkl"
+
+    def has(self, name):
+        """
+        Whether the result called name is saved.
+        """
+        return self._path(name).exists()
+
+    def load(self, name):
+        """
+        Load the result called name.
+        """
+        with open(self._path(name), "rb") as f:
+            return pickle.load(f)
+
+    def save(self, name, obj):
+        """
+        Save a complete result under name.
+
+        Parameters:
+        name (str): Name of the result.
+        obj (object): Picklable result, e.g. a dict of arrays.
+        """
+        path = self._path(name)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def remove(self):
+        """
+        Remove the checkpoint once the final output is written.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def frame_blocks(n_frames, block_size):
+    """
+    Split the frames of a trajectory into contiguous blocks.
+
+    Parameters:
+    n_frames (int): Number of frames.
+    block_size (int): Number of frames per block. The last block may be shorter.
+
+    Returns:
+    list of tuple: (start, stop) of each block.
+    """
+    return [(start, min(start + block_size, n_frames)) for start in range(0, n_frames, block_size)]
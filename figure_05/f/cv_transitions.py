@@ -0,0 +1,95 @@
+import numpy as np
+
+
+def last_values(x, lengths):
+    """
+    Value of a CV at the last frame of each trajectory.
+
+    Parameters:
+    x (numpy.ndarray): CV of shape (n_seeds, n_frames), e.g. CVEnsemble.cv().
+    lengths (numpy.ndarray): Number of frames of each trajectory, see CVEnsemble.lengths.
+
+    Returns:
+    numpy.ndarray: Values of shape (n_seeds,).
+    """
+    return x[np.arange(len(x)), np.asarray(lengths) - 1]
+
+
+def unwrap_frames(angles, period=2 * np.pi):
+    """
+    Unwrap angles along the frames of each trajectory at once, as np.unwrap() on each seed.
+    The NaN frames after the end of a shorter trajectory stay NaN.
+
+    Parameters:
+    angles (numpy.ndarray): Angles of shape (n_seeds, n_frames), e.g. CVEnsemble.cv("phi").
+
+    Returns:
+    numpy.ndarray: Unwrapped angles of the same shape, in memory.
+    """
+    return np.unwrap(angles, period=period, axis=1)
+
+
+def classify_paths(phi, lengths, reject_negative=True):
+    """
+    Transition path of each trajectory from its unwrapped phi.
+
+    Parameters:
+    phi (numpy.ndarray): Unwrapped phi of shape (n_seeds, n_frames), see unwrap_frames().
+    lengths (numpy.ndarray): Number of frames of each trajectory.
+    reject_negative (bool): Whether a trajectory reaching a negative phi at any frame is path2.
+
+    Returns:
+    numpy.ndarray: "path1" for a trajectory ending at a positive phi, "path2" for one ending below -1 or rejected.
+
+    Raises:
+    RuntimeError: If a trajectory that is not rejected ends between -1 and 0.
+    """
+    last = last_values(phi, lengths)
+    paths = np.full(len(phi), "", dtype="<U5")
+    paths[last > 0] = "path1"
+    paths[last < -1] = "path2"
+    if reject_negative:
+        paths[np.nanmin(phi, axis=1) < 0] = "path2"
+    if (paths == "").any():
+        i = np.flatnonzero(paths == "")[0]
+        raise RuntimeError(f"Trajectory {i} ends at phi = {last[i]:.3f}, neither path1 nor path2.")
+    return paths
+
+
+def first_above(x, threshold):
+    """
+    Row of the first frame at which a CV exceeds a threshold in each trajectory,
+    e.g. the docking of the neck mimic with contact_count_ratio above 0.99.
+
+    Parameters:
+    x (numpy.ndarray): CV of shape (n_seeds, n_frames).
+    threshold (float): Threshold.
+
+    Returns:
+    numpy.ndarray: Rows of shape (n_seeds,), -1 for a trajectory that never exceeds the threshold.
+    """
+    above = x > threshold
+    return np.where(above.any(axis=1), above.argmax(axis=1), -1)
+
+
+def gather_windows(x, rows, before, after, lengths):
+    """
+    Windows of frames of all the trajectories aligned at one row of each, gathered with one fancy index.
+
+    Parameters:
+    x (numpy.ndarray): Array of shape (n_seeds, n_frames, ...), e.g. CVEnsemble.values or CVEnsemble.cv().
+    rows (numpy.ndarray): Row of each trajectory at which its window is aligned, e.g. from first_above().
+    before (int): Number of frames before the row.
+    after (int): Number of frames after the row.
+    lengths (numpy.ndarray): Number of frames of each trajectory.
+
+    Returns:
+    tuple: (windows, valid) where
+        - windows is of shape (n_seeds, before + after + 1, ...) with the row at index before, NaN outside the trajectory.
+        - valid tells whether the whole window of each trajectory is within it, of shape (n_seeds,).
+    """
+    index = np.asarray(rows)[:, np.newaxis] + np.arange(-before, after + 1)
+    inside = (index >= 0) & (index < np.asarray(lengths)[:, np.newaxis])
+    windows = np.asarray(x[np.arange(len(x))[:, np.newaxis], np.clip(index, 0, x.shape[1] - 1)], dtype=np.float64)
+    windows[~inside] = np.nan
+    return windows, inside.all(axis=1)
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 import argparse
-import pathlib
 import warnings
 import seaborn as sns
 
@@ -17,68 +16,8 @@ import pickle
 from pathlib import Path
 
 from color_config import Color
-
-def unwrap_angles(df):
-    """
-    データフレーム内の 'theta' 列と 'phi' 列に np.unwrap を適用し、
-    修正後のデータフレームを返す関数。
-
-    Parameters:
-        df (pd.DataFrame): thetaとphi列を含むデータフレーム。
-
-    Returns:
-        pd.DataFrame: np.unwrap処理後のデータフレーム。
-    """
-    # データフレームのコピーを作成
-    df_unwrapped = df.copy()
-
-    # np.unwrap処理をtheta列とphi列に適用
-    df_unwrapped['theta'] = np.unwrap(df_unwrapped['theta'].values, period=2 * np.pi)
-    df_unwrapped['phi'] = np.unwrap(df_unwrapped['phi'].values, period=2 * np.pi)
-
-    return df_unwrapped
-
-def extract_transition(df):
-  if df['phi'].min() < 0: #1度でもpath2の方向に進んだらはじく
-    return None, "path2"
-
-  last_phi = df['phi'].iloc[-1]
-  if last_phi > 0:
-    # 条件を満たす最初の行のインデックスを取得
-    idx = (df['phi'] > 2).idxmax()
-  
-    # その行までのデータを取得
-    df_subset = df.copy()
-    return df_subset, 'path1'
-  elif last_phi < -1:
-    # 条件を満たす最初の行のインデックスを取得
-    idx = (df['phi'] < -4).idxmax()
-  
-    # その行までのデータを取得
-    df_subset = df.copy()
-    return df_subset, 'path2'
-  else:
-    raise RuntimeError
-    
-
-def extract_transition2(df):
-  last_phi = df['phi'].iloc[-1]
-  if last_phi > 0:
-    # 条件を満たす最初の行のインデックスを取得
-    idx = (df['contact_count_ratio'] > 0.99).idxmax()
-  
-    # その行までのデータを取得
-    df_subset = df.loc[:idx]
-    return df_subset, 'path1'
-  elif last_phi < -1:
-    # 条件を満たす最初の行のインデックスを取得
-    idx = (df['contact_count_ratio'] > 0.99).idxmax()
-  
-    # その行までのデータを取得
-    df_subset = df.loc[:idx]
-    return df_subset, 'path2'
-  else:
-    raise RuntimeError
+from cv_ensemble import load_ensemble
+from cv_transitions import classify_paths, unwrap_frames
 
 def plot_mean_with_std_dual_axis(data1, data2, output_path):
     """
@@ -92,24 +31,24 @@ def plot_mean_with_std_dual_axis(data1, data2, output_path):
     #setup colors
     colors = Color()
 
+    percent = 10
+
     # NumPy 配列に変換
-    data1 = np.array(data1)
-    data2 = np.array(data2)
+    data1 = np.asarray(data1, dtype=np.float64)
+    data2 = np.asarray(data2, dtype=np.float64)
 
-    # 各時間ステップごとの平均と標準偏差を計算
+    # 各時間ステップごとの平均、中央値とパーセンタイルを計算（短いトラジェクトリの後のNaNは除く）
     time_steps = np.arange(data1.shape[1])  # 時間軸 (0, 1, 2, ...)
 
-    percent = 10
-
-    means1 = np.mean(data1, axis=0)
-    medians1 = np.median(data1, axis=0)
-    std_devs1_lower = np.percentile(data1, percent, axis=0)
-    std_devs1_upper = np.percentile(data1, 100-percent, axis=0)
+    means1 = np.nanmean(data1, axis=0)
+    medians1 = np.nanmedian(data1, axis=0)
+    std_devs1_lower = np.nanpercentile(data1, percent, axis=0)
+    std_devs1_upper = np.nanpercentile(data1, 100-percent, axis=0)
 
-    means2 = np.mean(data2, axis=0)
-    medians2 = np.median(data2, axis=0)
-    std_devs2_lower = np.percentile(data2, percent, axis=0)
-    std_devs2_upper = np.percentile(data2, 100-percent, axis=0)
+    means2 = np.nanmean(data2, axis=0)
+    medians2 = np.nanmedian(data2, axis=0)
+    std_devs2_lower = np.nanpercentile(data2, percent, axis=0)
+    std_devs2_upper = np.nanpercentile(data2, 100-percent, axis=0)
 
     # 軸のスケール調整（原点から開始し、最後の値を合わせる）
     #scale_factor = means2[-1] / means1[-1]
@@ -205,40 +144,25 @@ def main():
     parser.add_argument("--kinesin", type=str, required=True, help="Directory containing CVs in parquet format for kinesin")
     parser.add_argument("--no-kinesin", type=str, required=True, help="Directory containing CVs in parquet format for no-neckmimic-kinesin")
     parser.add_argument("--out", type=str, required=True, help="Output file name")
+    parser.add_argument("--dataset", type=str, required=False, help="Dataset written by step01_build_dataset.py. --kinesin and --no-kinesin then name cases in it")
     parser.add_argument("--raw-data", type=str, required=True, help="Raw Data file name")
+    parser.add_argument("--cache-dir", type=str, required=False, help="Directory of the ensemble cache, disabled by default")
+    parser.add_argument("--n-workers", type=int, required=False, help="Number of threads reading the CV files, see cv_dataset.read_cv_files()")
+    parser.add_argument("--verbose", action="store_true", help="Print the time spent reading each CV file")
     args = parser.parse_args()
 
-    # List all the parquet files
-    paths_neckmimic = [str(file) for file in pathlib.Path(args.kinesin).rglob("*.parquet")]
-    paths_neckmimic = sorted(paths_neckmimic)
-    paths_no_neckmimic = [str(file) for file in pathlib.Path(args.no_kinesin).rglob("*.parquet")]
-    paths_no_neckmimic = sorted(paths_no_neckmimic)
-
     # Load dataframes
     sims = []
-    for paths in [paths_neckmimic, paths_no_neckmimic]:
-      phis = []
-      count = 0
-      for path in paths:
-          df = pd.read_parquet(path)
-
-          # Split trajectory
-          sim1 = df.iloc[:2000]
-          sim2 = df.iloc[2000:2300]
-          sim3 = df.iloc[2300:22300]
-          sim4 = df.iloc[22300:22600]
-          sim5 = df.iloc[22600:42600]
-
-
-          # Unwrap angles
-          df = unwrap_angles(sim3)
-
-          # Extract only transition part
-          df, pth = extract_transition(df)
-          if pth == 'path1':
-            phis.append(df['phi'].to_list()[:1200])
-            count += 1
-      sims.append(phis)
+    for source in [args.kinesin, args.no_kinesin]:
+      # List all the parquet files, or the trajectories of the case in the dataset, with the rows of the sim3 stage only
+      ensemble = load_ensemble(source, "*.parquet", ["theta", "phi"], args.dataset, stage="sim3", cache_dir=args.cache_dir, n_workers=args.n_workers, verbose=args.verbose)
+
+      # Unwrap angles of all the seeds at once
+      phi = unwrap_frames(ensemble.cv('phi'))
+
+      # Extract only transition part
+      path1 = classify_paths(phi, ensemble.lengths) == 'path1'
+      sims.append(phi[path1, :1200])
 
 
     plot_mean_with_std_dual_axis(sims[0], sims[1], args.out)
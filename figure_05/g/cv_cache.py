@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+
+# Options that do not change the output: input/output paths, parallelism, reader, cache, checkpoint and follow settings.
+# Input files enter the key through their fingerprints instead of their paths. The stage index from inp_dir is written next to the output.
+NON_KEY_OPTIONS = {"pdb", "dcd", "itp", "out", "n_workers", "subset_reader", "cache_dir", "cache_size",
+                   "checkpoint_dir", "block_size", "follow", "poll_interval", "idle_timeout", "inp_dir"}
+
+
+def fingerprint_file(filename, n_samples=8, sample_size=1 << 16):
+    """
+    Fast fingerprint of a file from its size and evenly spaced samples of its content.
+    The samples include the header and the last frame of a trajectory. Files smaller than
+    the samples together are hashed completely.
+
+    Parameters:
+    filename (str): File to fingerprint.
+    n_samples (int): Number of samples after the first one.
+    sample_size (int): Size of each sample in bytes.
+
+    Returns:
+    str: Hexadecimal fingerprint.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    size = os.path.getsize(filename)
+    h.update(str(size).encode())
+    with open(filename, "rb") as f:
+        if size <= (n_samples + 1) * sample_size:
+            h.update(f.read())
+        else:
+            for i in range(n_samples + 1):
+                f.seek(i * (size - sample_size) // n_samples)
+                h.update(f.read(sample_size))
+    return h.hexdigest()
+
+
+def key_options(args):
+    """
+    Options of a step01 script that change its output.
+
+    Parameters:
+    args (argparse.Namespace): Parsed arguments of the step01 script.
+
+    Returns:
+    dict: Options without those listed in NON_KEY_OPTIONS.
+    """
+    return {k: v for k, v in vars(args).items() if k not in NON_KEY_OPTIONS}
+
+
+def content_key(files, options, sources):
+    """
+    Key of the output of a step01 script.
+
+    Parameters:
+    files (list of str): Input files. Missing entries (None) are ignored.
+    options (dict): Options that change the output, see key_options().
+    sources (list of str): Source files of the code producing the output.
+
+    Returns:
+    str: Hexadecimal key.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for filename in files:
+        if filename is not None:
+            h.update(fingerprint_file(filename).encode())
+    h.update(json.dumps(options, sort_keys=True, default=str).encode())
+    for source in sources:
+        h.update(Path(source).read_bytes())
+    return h.hexdigest()
+
+
+class CVCache:
+    """
+    Content-addressed cache of step01 outputs.
+
+    Entries are keyed on the fingerprints of the input files, the options that change the output
+    and the source code of the script, so renamed directories still hit while regenerated DCDs,
+    changed selections or changed code miss. Hits refresh the modification time of an entry, and
+    the least recently used entries are evicted once the cache exceeds its size limit.
+
+    Attributes:
+    directory (Path): Cache directory.
+    max_bytes (int or None): Size limit of the cache directory. None disables eviction.
+    """
+
+    def __init__(self, directory, max_gb=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = None if max_gb is None else int(max_gb * 1024**3)
+
+    def _path(self, key, out):
+        return self.directory / f"{key}{Path(out).suffix}"
+
+    def fetch(self, key, out):
+        """
+        Copy a cached entry to out.
+
+        Parameters:
+        key (str): Key returned by content_key().
+        out (str): Output file name. Its suffix is part of the entry name.
+
+        Returns:
+        bool: True on a cache hit.
+        """
+        path = self._path(key, out)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        copy_atomic(path, out)
+        return True
+
+    def store(self, key, out):
+        """
+        Add an output file to the cache and evict old entries if needed.
+
+        Parameters:
+        key (str): Key returned by content_key().
+        out (str): Output file to store.
+        """
+        copy_atomic(out, self._path(key, out))
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+        """
+        if self.max_bytes is None:
+            return
+
+        entries = []
+        for path in self.directory.iterdir():
+            # Skip files still being copied by copy_atomic()
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def copy_atomic(src, dst):
+    """
+    Copy a file so that readers never see a partially written destination.
+
+    Parameters:
+    src (str): Source file.
+    dst (str): Destination file.
+    """
+    dst = Path(dst)
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
@@ -0,0 +1,290 @@
+import os
+import re
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from stage_index import STAGES, read_stage_index
+
+# Hive partitioning of the dataset: <out>/case=<case>/state=<state>/stage=<stage>/part-0.parquet
+PARTITIONING = ds.partitioning(
+    pa.schema([("case", pa.string()), ("state", pa.string()), ("stage", pa.string())]),
+    flavor="hive",
+)
+
+# Columns identifying the rows of one case
+INDEX_COLUMNS = ["seed", "state", "frame"]
+
+
+def parse_seed(path):
+    """
+    Seed of a per-seed file from its sim-NNNN directory.
+
+    Parameters:
+    path (str): File in <case>/sim-NNNN/.
+
+    Returns:
+    int: Seed number.
+    """
+    matches = re.findall(r"sim-(\d+)", str(path))
+    if not matches:
+        raise ValueError(f"{path} is not in a sim-NNNN directory.")
+    return int(matches[-1])
+
+
+def read_cv_file(path, columns=None, stage=None):
+    """
+    Read a per-seed file written by a step01 script.
+
+    Parameters:
+    path (str): Parquet or CSV file.
+    columns (list of str, optional): Columns to read. Parquet files skip the other column chunks,
+        and CSV files parse only these columns. Defaults to all columns.
+    stage (str, optional): Stage whose rows to return, see stage_index.read_stage_index(). Parquet files
+        decode only the row groups overlapping them (one per stage as written by the step01 scripts), and
+        CSV files skip the lines before them and stop after them. Defaults to all rows.
+
+    Returns:
+    pandas.DataFrame: CVs without the unnamed index column of the CSV files, indexed by frame.
+    """
+    path = Path(path)
+    start, stop = (0, None) if stage is None else read_stage_index(path)[stage]
+    if path.suffix == ".parquet":
+        if stage is None:
+            return pd.read_parquet(path, columns=columns)
+        df = read_parquet_rows(path, start, stop, columns)
+    else:
+        rows = {} if stage is None else {"skiprows": range(1, start + 1), "nrows": max(stop - start, 0)}
+        if columns is not None:
+            df = pd.read_csv(path, usecols=columns, **rows)[columns]
+        else:
+            df = pd.read_csv(path, **rows).drop(columns=["Unnamed: 0"], errors="ignore")
+    return df.set_axis(pd.RangeIndex(start, start + len(df)))
+
+
+def read_parquet_rows(path, start, stop, columns=None):
+    """
+    Rows start:stop of a Parquet file, decoding only the row groups that overlap them.
+
+    Parameters:
+    path (str): Parquet file.
+    start, stop (int): Rows to read, clipped to those of the file.
+    columns (list of str, optional): Columns to read. Defaults to all columns.
+
+    Returns:
+    pandas.DataFrame: Rows of the file with a default index.
+    """
+    f = pq.ParquetFile(path)
+    offsets = np.cumsum([0] + [f.metadata.row_group(i).num_rows for i in range(f.num_row_groups)])
+    groups = [i for i in range(f.num_row_groups) if offsets[i] < stop and offsets[i + 1] > start]
+    if not groups:
+        return f.schema_arrow.empty_table().select(columns or f.schema_arrow.names).to_pandas().reset_index(drop=True)
+    first = offsets[groups[0]]
+    table = f.read_row_groups(groups, columns=columns)
+    return table.slice(start - first, stop - start).to_pandas().reset_index(drop=True)
+
+
+def read_cv_files(paths, columns=None, stage=None, n_workers=None):
+    """
+    Read per-seed files concurrently with a pool of threads, see read_cv_file().
+
+    pyarrow and the CSV parser of pandas release the GIL while they decode, and the threads overlap
+    the latency of each file, e.g. on a network file system. At most 2 * n_workers files are read
+    ahead of the consumer, so the memory in use does not grow with the number of files.
+
+    Parameters:
+    paths (list of str): Files to read.
+    columns (list of str, optional): Columns to read. Defaults to all columns.
+    stage (str, optional): Stage whose rows to return. Defaults to all rows.
+    n_workers (int, optional): Number of threads. Defaults to that of ThreadPoolExecutor, min(32, CPUs + 4).
+
+    Yields:
+    tuple: (path, df, seconds) in the order of paths, where seconds is the time spent reading the file.
+    """
+    def read(path):
+        start = time.perf_counter()
+        df = read_cv_file(path, columns, stage)
+        return df, time.perf_counter() - start
+
+    n_workers = n_workers or min(32, (os.cpu_count() or 1) + 4)
+    executor = ThreadPoolExecutor(max_workers=n_workers)
+    pending = deque()
+    try:
+        for path in paths:
+            pending.append((path, executor.submit(read, path)))
+            if len(pending) > 2 * n_workers:
+                path, future = pending.popleft()
+                yield path, *future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield path, *future.result()
+    finally:
+        # Files not consumed yet, e.g. after islice(), are not read (shutdown(cancel_futures=True) needs Python 3.9)
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown()
+
+
+def stage_labels(n_frames, stages=STAGES):
+    """
+    Stage of each frame of a trajectory.
+
+    Parameters:
+    n_frames (int): Number of frames.
+    stages (dict or None): Rows of the stages, see STAGES. None puts all frames in stage "all".
+
+    Returns:
+    numpy.ndarray: Stage names. Frames outside all the ranges are labelled "other".
+    """
+    if stages is None:
+        return np.full(n_frames, "all", dtype=object)
+    labels = np.full(n_frames, "other", dtype=object)
+    for name, (start, stop) in stages.items():
+        labels[start:stop] = name
+    return labels
+
+
+def write_dataset(case_dirs, pattern, out, stages=STAGES):
+    """
+    Merge the per-seed files of several cases into one Parquet dataset partitioned by case, state and stage.
+
+    The state is the file stem (e.g. free, alf3 or trajectory), and the seed and frame columns are added
+    to the CVs. The stages of each file come from its stage index (see stage_index.py) if it has one. Each partition is one file sorted by seed and frame with one row group per seed, so the
+    row-group statistics let readers skip the seeds they do not need.
+
+    Parameters:
+    case_dirs (list of str): Directories holding sim-NNNN/<state> files. The directory name is the case.
+    pattern (str): File name pattern of the per-seed files, e.g. "*.parquet" or "*.csv".
+    out (str): Dataset directory. Existing partitions of the given cases are replaced.
+    stages (dict or None): Rows of the stages of files without a stage index, see stage_labels().
+        None keeps all frames of these files in stage "all".
+
+    Returns:
+    int: Number of merged files.
+    """
+    out = Path(out)
+    n_files = 0
+    for case_dir in case_dirs:
+        case = Path(case_dir).name
+        shutil.rmtree(out / f"case={case}", ignore_errors=True)
+
+        writers = {}
+        try:
+            # Sorted paths give the seeds of each partition in ascending order
+            for path in sorted(Path(case_dir).rglob(pattern)):
+                df = read_cv_file(path)
+                df.insert(0, "frame", np.arange(len(df), dtype=np.int32))
+                df.insert(0, "seed", np.int32(parse_seed(path)))
+
+                labels = stage_labels(len(df), read_stage_index(path, stages))
+                for stage in pd.unique(labels):
+                    table = pa.Table.from_pandas(df[labels == stage], preserve_index=False)
+                    key = (path.stem, stage)
+                    if key not in writers:
+                        directory = out / f"case={case}" / f"state={path.stem}" / f"stage={stage}"
+                        directory.mkdir(parents=True, exist_ok=True)
+                        writers[key] = pq.ParquetWriter(directory / "part-0.parquet", table.schema)
+                    writers[key].write_table(table.cast(writers[key].schema))
+                n_files += 1
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+    return n_files
+
+
+def read_dataset(dataset, case, state=None, columns=None, seeds=None, stages=None):
+    """
+    Read the CVs of one case from a dataset written by write_dataset() in a single scan.
+    Only the requested columns and the matching partitions and row groups are read.
+
+    Parameters:
+    dataset (str): Dataset directory.
+    case (str): Case, e.g. "kinesin".
+    state (str, optional): State, e.g. "free". Defaults to all states.
+    columns (list of str, optional): CV columns. Defaults to all columns.
+    seeds (list of int, optional): Seeds. Defaults to all seeds.
+    stages (list of str, optional): Stages, e.g. ["sim3"]. Defaults to all stages.
+
+    Returns:
+    pandas.DataFrame: Rows sorted by seed, state and frame with the seed, state and frame columns.
+    """
+    condition = ds.field("case") == case
+    if state is not None:
+        condition &= ds.field("state") == state
+    if seeds is not None:
+        condition &= ds.field("seed").isin(list(seeds))
+    if stages is not None:
+        condition &= ds.field("stage").isin(list(stages))
+
+    if columns is not None:
+        columns = INDEX_COLUMNS + [column for column in columns if column not in INDEX_COLUMNS]
+
+    table = ds.dataset(dataset, format="parquet", partitioning=PARTITIONING).to_table(columns=columns, filter=condition)
+    return table.to_pandas().sort_values(INDEX_COLUMNS, kind="stable").reset_index(drop=True)
+
+
+def iter_cv_items(source, pattern, dataset=None, columns=None, stage=None, n_workers=None, verbose=False):
+    """
+    Iterate over the per-seed CV tables of one case with their seed and state, see iter_cv_tables().
+
+    Yields:
+    tuple: (seed, state, df) where
+        - seed is the seed of the sim-NNNN directory of a file, or None for a file outside one.
+        - state is the file stem, e.g. free or trajectory.
+        - df holds the CVs of one trajectory as yielded by iter_cv_tables().
+    """
+    start = time.perf_counter()
+    if dataset is None:
+        paths = sorted(Path(source).rglob(pattern))
+        total = 0.0
+        for i, (path, df, seconds) in enumerate(read_cv_files(paths, columns, stage, n_workers), 1):
+            total += seconds
+            if verbose:
+                print(f"[{i}/{len(paths)}] {path} ({len(df)} rows, {seconds:.2f} s)")
+            seed = parse_seed(path) if re.search(r"sim-\d+", str(path)) else None
+            yield seed, path.stem, df
+        if verbose:
+            print(f"{source}: {len(paths)} files in {time.perf_counter() - start:.2f} s ({total:.2f} s of file reads)")
+        return
+
+    stem = Path(pattern).stem
+    state = None if re.search(r"[*?\[]", stem) else stem
+    df = read_dataset(dataset, source, state=state, columns=columns, stages=None if stage is None else [stage])
+    if verbose:
+        print(f"{dataset} case={source}: {len(df)} rows in {time.perf_counter() - start:.2f} s")
+    for (seed, state), group in df.groupby(["seed", "state"], sort=True):
+        index = pd.Index(group["frame"].to_numpy(np.int64))
+        yield int(seed), state, group.drop(columns=["case", "stage", *INDEX_COLUMNS], errors="ignore").set_axis(index)
+
+
+def iter_cv_tables(source, pattern, dataset=None, columns=None, stage=None, n_workers=None, verbose=False):
+    """
+    Iterate over the per-seed CV tables of one case in the order of their sorted file paths.
+    With a stage, only its rows are returned. A dataset then reads only the stage partition,
+    and files are cut at the rows of their stage index (see stage_index.py).
+
+    Parameters:
+    source (str): Directory searched recursively for files matching pattern, or the case in dataset.
+    pattern (str): File name pattern of the per-seed files, e.g. "*.parquet" or "free.csv".
+        In a dataset, the stem of the pattern selects the state unless it is a wildcard.
+    dataset (str, optional): Dataset written by write_dataset(). Without it the files are read
+        concurrently, see read_cv_files().
+    columns (list of str, optional): CV columns to read. Defaults to all columns.
+    stage (str, optional): Stage, e.g. "sim3". Defaults to all frames.
+    n_workers (int, optional): Number of threads reading the files.
+    verbose (bool): Whether to print the time spent reading each file.
+
+    Yields:
+    pandas.DataFrame: CVs of one trajectory indexed by frame, which starts at the first frame of the stage.
+    """
+    for _, _, df in iter_cv_items(source, pattern, dataset, columns, stage, n_workers, verbose):
+        yield df
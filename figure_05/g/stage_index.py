@@ -0,0 +1,161 @@
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+
+# Frame ranges of the stages in the switching trajectories, used for outputs without a stage index.
+# sim1 (free, 2000 frames), sim2 (minimization, 300 frames) and sim3 (AlF3, 20000 frames) follow
+# simulation_files/switching_go_simulations/*/inp/sim1-3.inp.
+STAGES = {
+    "sim1": (0, 2000),
+    "sim2": (2000, 2300),
+    "sim3": (2300, 22300),
+    "sim4": (22300, 22600),
+    "sim5": (22600, 42600),
+}
+
+
+def read_inp_parameters(inp, names):
+    """
+    Read parameters of a GENESIS input file.
+    Comments after "#" and section headers in brackets are skipped.
+
+    Parameters:
+    inp (str): GENESIS input file, e.g. inp/sim3.inp.
+    names (iterable of str): Parameter names, e.g. ["nsteps", "crdout_period"].
+
+    Returns:
+    dict: Parameter name to value string. Missing parameters are left out.
+    """
+    names = set(names)
+    parameters = {}
+    with open(inp) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if "=" not in line or line.startswith("["):
+                continue
+            name, value = (field.strip() for field in line.split("=", 1))
+            if name in names:
+                parameters[name] = value
+    return parameters
+
+
+def read_stages(inp_dir, pattern="sim*.inp", defaults=STAGES):
+    """
+    Frame ranges of the stages of a chained trajectory from the GENESIS inputs of its runs.
+
+    Each input writes nsteps // crdout_period frames, and the stages follow each other in the
+    order of their run numbers. Stages of defaults without an input file (sim4 and sim5 of the
+    switching protocol) follow the parsed ones with their default lengths.
+
+    Parameters:
+    inp_dir (str): Directory of the inputs, e.g. inp/ holding sim1.inp, sim2.inp and sim3.inp.
+    pattern (str): File name pattern of the inputs. The file stem is the stage name.
+    defaults (dict or None): Frame ranges of the stages without an input file, see STAGES.
+
+    Returns:
+    dict: Stage name to (start, stop) frames.
+    """
+    paths = sorted(Path(inp_dir).glob(pattern), key=lambda path: [int(n) for n in re.findall(r"\d+", path.stem)])
+    if not paths:
+        raise FileNotFoundError(f"No {pattern} in {inp_dir}.")
+
+    stages = {}
+    offset = 0
+    for path in paths:
+        parameters = read_inp_parameters(path, ["nsteps", "crdout_period"])
+        if len(parameters) != 2:
+            raise ValueError(f"{path} has no nsteps or crdout_period.")
+        n_frames = int(parameters["nsteps"]) // int(parameters["crdout_period"])
+        stages[path.stem] = (offset, offset + n_frames)
+        offset += n_frames
+
+    for name, (start, stop) in (defaults or {}).items():
+        if name not in stages:
+            stages[name] = (offset, offset + stop - start)
+            offset += stop - start
+    return stages
+
+
+def stage_rows(stages, frames):
+    """
+    Rows of each stage in an output holding the given frames of a trajectory.
+
+    Parameters:
+    stages (dict): Stage name to (start, stop) frames, see read_stages().
+    frames (range): Frames of the trajectory in the output, e.g. range(n_frames)[start:stop:step].
+
+    Returns:
+    dict: Stage name to (start, stop) rows. Stages without rows are left out.
+    """
+    frames = np.asarray(frames)
+    rows = {}
+    for name, (start, stop) in stages.items():
+        first, last = np.searchsorted(frames, [start, stop])
+        if last > first:
+            rows[name] = (int(first), int(last))
+    return rows
+
+
+def write_parquet_stages(table, path, rows=None):
+    """
+    Write a table to a Parquet file with one row group per stage, so that a stage is read
+    without decoding the rows of the others (see cv_dataset.read_cv_file()).
+
+    Parameters:
+    table (pyarrow.Table): Rows of an output.
+    path (str): Parquet file.
+    rows (dict, optional): Stage name to (start, stop) rows, see stage_rows(). The table is split
+        at the bounds of all the stages. Without them, it is written as it is.
+    """
+    # Imported here so that the step01 scripts writing CSV files do not need pyarrow
+    import pyarrow.parquet as pq
+
+    bounds = {0, table.num_rows}
+    for start, stop in (rows or {}).values():
+        bounds.update(bound for bound in (start, stop) if 0 < bound < table.num_rows)
+    bounds = sorted(bounds)
+    with pq.ParquetWriter(path, table.schema) as writer:
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            writer.write_table(table.slice(start, stop - start))
+
+
+def stage_index_path(out):
+    """
+    Stage index file of an output, e.g. trajectory.stages.json for trajectory.parquet.
+    """
+    return Path(out).with_suffix(".stages.json")
+
+
+def write_stage_index(out, rows):
+    """
+    Write the stage index of an output next to it.
+
+    Parameters:
+    out (str): Output file.
+    rows (dict): Stage name to (start, stop) rows, see stage_rows().
+    """
+    path = stage_index_path(out)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({name: list(bounds) for name, bounds in rows.items()}, indent=2))
+    os.replace(tmp, path)
+
+
+def read_stage_index(out, default=STAGES):
+    """
+    Stage index of an output.
+
+    Parameters:
+    out (str): Output file.
+    default (dict or None): Rows of the stages of an output without a stage index.
+
+    Returns:
+    dict: Stage name to (start, stop) rows.
+    """
+    path = stage_index_path(out)
+    if not path.exists():
+        return default
+    return {name: tuple(bounds) for name, bounds in json.loads(path.read_text()).items()}
@@ -0,0 +1,18 @@
+#!/bin/bash -e
+
+# Define input/output directories
+DATA_DIR="/path/to/data_dir"
+ARCHIVE_DIR="/path/to/archive_dir"
+
+# Write the trajectory of each seed to an archive of coordinates quantized to 0.01 Angstrom.
+# The step01 scripts read trajectory.dcdz in place of trajectory.dcd.
+uv run \
+  --with numpy \
+  ./step01_batch.py \
+    --script step00_archive_trajectory \
+    --case kinesin \
+    --seeds 1 100 \
+    -- \
+      --dcd "${DATA_DIR}/{case}/{sim}/trajectory.dcd" \
+      --out "${ARCHIVE_DIR}/{case}/{sim}/trajectory.dcdz" \
+      --precision 0.01
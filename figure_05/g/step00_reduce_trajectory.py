@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import warnings
+from pathlib import Path
+
+warnings.filterwarnings("ignore")
+warnings.warn = lambda *args, **kwargs: None
+
+import MDAnalysis as mda
+
+from dcd_reader import SubsetDCDReader, write_subset_dcd
+
+
+# Kinesin and the microtubule subunits C, G and L used by --sel-msu1/2/3 of the step01 scripts
+DEFAULT_KEEP = [
+    "resid 7516-8266",
+    "resid 836-1252",
+    "resid 2506-2922",
+    "resid 4593-5010",
+]
+
+
+def load_universe(pdb, dcd=None, topologies=None):
+    """
+    Load a trajectory onto its topology.
+
+    Parameters:
+    pdb (str): PDB file for topology.
+    dcd (str, optional): DCD file for trajectory. Without it the universe holds the PDB coordinates.
+    topologies (dict, optional): Cache of parsed topologies. When given, each PDB is parsed once
+        and the universe is reused by later calls in the same process.
+
+    Returns:
+    MDAnalysis.Universe: Universe holding the topology and the trajectory.
+    """
+    if topologies is None:
+        return mda.Universe(str(pdb)) if dcd is None else mda.Universe(str(pdb), str(dcd))
+
+    key = (str(pdb), dcd is None)
+    if key not in topologies:
+        topologies[key] = mda.Universe(str(pdb))
+    uni = topologies[key]
+    if dcd is not None:
+        uni.load_new(str(dcd))
+    return uni
+
+
+def write_pdb(atoms, filename):
+    """
+    Write atoms to a PDB file. The file is replaced atomically, so that
+    workers reducing several seeds of the same case can write it concurrently.
+
+    Parameters:
+    atoms (AtomGroup): Atoms to write.
+    filename (str): Output PDB file.
+    """
+    filename = Path(filename)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    tmp = filename.with_name(f".{filename.name}.{os.getpid()}.pdb")
+    atoms.write(str(tmp))
+    os.replace(tmp, filename)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Write a trajectory reduced to the atoms used by the analyses")
+    parser.add_argument("--pdb", type=str, required=True, help="PDB file for topology")
+    parser.add_argument("--dcd", type=str, required=True, help="DCD file for trajectory")
+    parser.add_argument("--keep", type=str, nargs="+", default=DEFAULT_KEEP, help="Selection strings of the atoms to keep")
+    parser.add_argument("--out", type=str, required=True, help="Output DCD file name")
+    parser.add_argument("--out-pdb", type=str, required=True, help="Output PDB file name for the reduced topology")
+    return parser
+
+
+def run(args, topologies=None):
+    """
+    Reduce one trajectory and its topology to the selected atoms.
+    Residue numbers are kept, so the selection strings of the step01 scripts work on the reduced files.
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    topologies (dict, optional): Cache of parsed topologies, see load_universe().
+    """
+    # Select the atoms to keep in their original order
+    uni = load_universe(args.pdb, topologies=topologies)
+    atoms = uni.select_atoms(" or ".join(f"({sel})" for sel in args.keep))
+
+    # Check that the trajectory matches the topology
+    reader = SubsetDCDReader(args.dcd)
+    if reader.n_atoms != uni.atoms.n_atoms:
+        raise ValueError(f"{args.dcd} has {reader.n_atoms} atoms but {args.pdb} has {uni.atoms.n_atoms}.")
+
+    # Write the reduced trajectory and topology
+    write_subset_dcd(reader, atoms.indices, args.out)
+    write_pdb(atoms, args.out_pdb)
+    print(f"{args.out}: {atoms.n_atoms} of {reader.n_atoms} atoms, {reader.n_frames} frames")
+
+
+def main():
+    args = get_parser().parse_args()
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
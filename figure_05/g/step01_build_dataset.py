@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+
+import argparse
+
+from cv_dataset import STAGES, write_dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the per-seed step01 outputs into one partitioned Parquet dataset")
+    parser.add_argument("--dirs", type=str, nargs="+", required=True, help="Case directories holding sim-NNNN/ subdirectories")
+    parser.add_argument("--pattern", type=str, default="*.parquet", help="File name pattern of the per-seed files")
+    parser.add_argument("--out", type=str, required=True, help="Output dataset directory")
+    parser.add_argument("--no-stages", action="store_true", help="Keep all frames of the files without a stage index in one stage instead of splitting them into sim1-sim5")
+    args = parser.parse_args()
+
+    n_files = write_dataset(args.dirs, args.pattern, args.out, stages=None if args.no_stages else STAGES)
+    print(f"{args.out}: {n_files} files merged")
+
+
+if __name__ == "__main__":
+    main()
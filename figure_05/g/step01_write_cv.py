@@ -1,7 +1,13 @@
 #!/usr/bin/env python
 
 import argparse
+import inspect
+import os
+import shutil
+import time
 import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import repeat
 from pathlib import Path
 
 warnings.filterwarnings("ignore")
@@ -10,49 +16,56 @@ warnings.warn = lambda *args, **kwargs: None
 import numpy as np
 import polars as pl
 import MDAnalysis as mda
-from msm_utils.plot_angle_vs_native_contacts import angle_vs_contacts
 from tqdm import tqdm
 
+from checkpoint import Checkpoint, frame_blocks
+from cv_cache import CVCache, content_key, key_options
+from dcd_reader import dcd_files, is_frame_index, open_dcd
+import mda_archive  # registers the .dcdz archive reader with MDAnalysis
+from native_contacts import NativeContacts
+from stage_index import read_stages, stage_rows, write_parquet_stages, write_stage_index
 
-def calculate_spherical_angles_rotated(vector, x_prime, y_prime, z_prime):
+
+def calculate_spherical_angles_rotated(vectors, x_primes, y_primes, z_primes):
     """
-    Calculate the spherical angles (theta and phi) for a vector in a rotated coordinate system.
+    Calculate the spherical angles (theta and phi) for vectors in rotated coordinate systems.
 
     Parameters:
-    vector (array-like): A 3D vector [vx, vy, vz].
-    x_prime (array-like): Unit vector representing x_prime in the global coordinate system.
-    y_prime (array-like): Unit vector representing y_prime in the global coordinate system.
-    z_prime (array-like): Unit vector representing z_prime in the global coordinate system.
+    vectors (array-like): 3D vectors of shape (N, 3).
+    x_primes (array-like): Unit vectors of shape (N, 3) representing x_prime in the global coordinate system.
+    y_primes (array-like): Unit vectors of shape (N, 3) representing y_prime in the global coordinate system.
+    z_primes (array-like): Unit vectors of shape (N, 3) representing z_prime in the global coordinate system.
 
     Returns:
-    tuple: (theta, phi) where
+    tuple: (theta, phi) arrays of shape (N,) where
         - theta is the polar angle in radians [0, pi].
         - phi is the azimuthal angle in radians [-pi, pi].
+
+    Raises:
+    ValueError: If the basis vectors of any frame are not orthonormal. The message lists the frame indices.
     """
-    # Ensure inputs are NumPy arrays
-    vector = np.array(vector)
-    x_prime = np.array(x_prime)
-    y_prime = np.array(y_prime)
-    z_prime = np.array(z_prime)
+    # Stack the basis vectors as the rows of the rotation matrices, shape (N, 3, 3)
+    vectors = np.asarray(vectors)
+    basis = np.stack((x_primes, y_primes, z_primes), axis=1)
 
     # Ensure the basis vectors are orthonormal
-    if not (np.isclose(np.linalg.norm(x_prime), 1.0) and
-            np.isclose(np.linalg.norm(y_prime), 1.0) and
-            np.isclose(np.linalg.norm(z_prime), 1.0)):
-        raise ValueError("Basis vectors must be unit vectors.")
-    if not (np.isclose(np.dot(x_prime, y_prime), 0) and
-            np.isclose(np.dot(y_prime, z_prime), 0) and
-            np.isclose(np.dot(z_prime, x_prime), 0)):
-        raise ValueError("Basis vectors must be orthogonal.")
-
-    # Construct the rotation matrix
-    R = np.column_stack((x_prime, y_prime, z_prime))
-
-    # Transform the vector into the rotated coordinate system
-    vector_rotated = np.dot(R.T, vector)
-
-    # Extract components of the transformed vector
-    vx_prime, vy_prime, vz_prime = vector_rotated
+    is_unit = np.isclose(np.linalg.norm(basis, axis=2), 1.0).all(axis=1)
+    if not is_unit.all():
+        raise ValueError(f"Basis vectors must be unit vectors (frames: {np.flatnonzero(~is_unit).tolist()}).")
+    dots = np.stack((
+        np.einsum("ij,ij->i", basis[:, 0], basis[:, 1]),
+        np.einsum("ij,ij->i", basis[:, 1], basis[:, 2]),
+        np.einsum("ij,ij->i", basis[:, 2], basis[:, 0]),
+    ), axis=1)
+    is_orthogonal = np.isclose(dots, 0).all(axis=1)
+    if not is_orthogonal.all():
+        raise ValueError(f"Basis vectors must be orthogonal (frames: {np.flatnonzero(~is_orthogonal).tolist()}).")
+
+    # Transform the vectors into the rotated coordinate systems
+    vectors_rotated = np.einsum("nij,nj->ni", basis, vectors)
+
+    # Extract components of the transformed vectors
+    vx_prime, vy_prime, vz_prime = vectors_rotated.T
 
     # Calculate spherical angles
     theta = np.arccos(vz_prime)
@@ -61,62 +74,233 @@ def calculate_spherical_angles_rotated(vector, x_prime, y_prime, z_prime):
     return theta, phi
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--sel-stalk1", type=str, required=True, help="Selection string for the stalk 1")
-    parser.add_argument("--sel-stalk2", type=str, required=True, help="Selection string for the stalk 2")
-    parser.add_argument("--sel-msu1", type=str, required=True, help="Selection for the microtubule subunit C")
-    parser.add_argument("--sel-msu2", type=str, required=True, help="Selection for the microtubule subunit G")
-    parser.add_argument("--sel-msu3", type=str, required=True, help="Selection for the microtubule subunit L")
-    parser.add_argument("--pdb", type=str, required=True, help="PDB file for topology")
-    parser.add_argument("--dcd", type=str, required=True, help="DCD file for trajectory")
-    parser.add_argument("--itp", type=str, required=True, help="ITP file for trajectory")
-    parser.add_argument("--out", type=str, required=True, help="Output file name")
-    args = parser.parse_args()
+def define_point_groups(stalk1, stalk2, msu1, msu2, msu3):
+    """
+    Define the atom groups whose centers of geometry give the stalk vector and the microtubule plane.
 
-    # Load data
-    uni = mda.Universe(args.pdb, args.dcd)
+    Parameters:
+    stalk1, stalk2 (AtomGroup): Atoms of the stalk 1 and the stalk 2.
+    msu1, msu2, msu3 (AtomGroup): Atoms of the microtubule subunits C, G and L.
+
+    Returns:
+    dict: AtomGroups keyed by "top", "bottom", "msu1", "msu2" and "msu3".
+    """
+    return {
+        "top": stalk1[10:15] + stalk2[10:15],
+        "bottom": stalk1[-5:],
+        "msu1": msu1,
+        "msu2": msu2,
+        "msu3": msu3,
+    }
 
-    # Define selections
-    stalk1 = uni.select_atoms(args.sel_stalk1)
-    stalk2 = uni.select_atoms(args.sel_stalk2)
-    msu1 = uni.select_atoms(args.sel_msu1)
-    msu2 = uni.select_atoms(args.sel_msu2)
-    msu3 = uni.select_atoms(args.sel_msu3)
 
+def calculate_points(uni, stalk1, stalk2, msu1, msu2, msu3, start=None, stop=None, step=None, contacts=None):
+    """
+    Calculate the points defining the stalk vector and the microtubule plane in a single trajectory pass.
+
+    Parameters:
+    uni (MDAnalysis.Universe): Universe holding the topology and the trajectory.
+    stalk1, stalk2 (AtomGroup): Atoms of the stalk 1 and the stalk 2.
+    msu1, msu2, msu3 (AtomGroup): Atoms of the microtubule subunits C, G and L.
+    start, stop, step (int, optional): Frames to process, as in a slice. Defaults to the whole trajectory.
+    contacts (NativeContacts, optional): Native contact analysis evaluated on the same frames.
+
+    Returns:
+    dict: Centers of geometry of shape (n_frames, 3) where
+        - "top" and "bottom" define the stalk vector.
+        - "msu1", "msu2" and "msu3" define the microtubule plane.
+        With contacts, the values of NativeContacts.evaluate() are included.
+    """
     # Define point selections
-    sel1 = stalk1[10:15] + stalk2[10:15]
-    sel2 = stalk1[-5:]
+    groups = define_point_groups(stalk1, stalk2, msu1, msu2, msu3)
+
+    # Read each frame once and evaluate all the points on it
+    frames = uni.trajectory[start:stop:step]
+    points = {name: np.zeros((len(frames), 3)) for name in groups}
+    if contacts is not None:
+        points.update(contacts.allocate(len(frames)))
+    for i, ts in enumerate(tqdm(frames)):
+        for name, group in groups.items():
+            points[name][i] = group.center_of_geometry()
+        if contacts is not None:
+            for name, value in contacts.evaluate(ts.positions[contacts.indices]).items():
+                points[name][i] = value
+
+    return points
+
+
+def calculate_points_subset(reader, stalk1, stalk2, msu1, msu2, msu3, start=None, stop=None, step=None, contacts=None, chunk=1000):
+    """
+    Calculate the same points as calculate_points() with a reader of dcd_reader.
+    Only the coordinates of the selected atoms are read, so most of the microtubule lattice is never touched.
+    All the groups are read from one block of frames before the next, so the chunks of an archive are decoded once.
+
+    Parameters:
+    reader (SubsetDCDReader, ChainedDCDReader or ArchiveReader): Reader of the trajectory, see dcd_reader.open_dcd().
+    stalk1, stalk2, msu1, msu2, msu3 (AtomGroup): See calculate_points(). Only their indices are used.
+    start, stop, step (int, optional): Frames to process, as in a slice. Defaults to the whole trajectory.
+    contacts (NativeContacts, optional): Native contact analysis evaluated on the same frames.
+    chunk (int): Number of frames read at once.
+
+    Returns:
+    dict: Centers of geometry as returned by calculate_points().
+    """
+    groups = define_point_groups(stalk1, stalk2, msu1, msu2, msu3)
+    frames = range(reader.n_frames)[start:stop:step]
+    points = {name: np.zeros((len(frames), 3)) for name in groups}
+    if contacts is not None:
+        points.update(contacts.allocate(len(frames)))
+    for i in range(0, len(frames), chunk):
+        block = frames[i:i + chunk]
+        for name, group in groups.items():
+            points[name][i:i + len(block)] = reader.center_of_geometry(group.indices, block.start, block.stop, block.step)
+        if contacts is not None:
+            for name, value in contacts.evaluate_reader(reader, block.start, block.stop, block.step).items():
+                points[name][i:i + len(block)] = value
+    return points
+
+
+def read_points(args, uni, start=None, stop=None, step=None, contacts=None):
+    """
+    Calculate the points with the trajectory reader selected by args.
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    uni (MDAnalysis.Universe): Universe holding the topology, and the trajectory unless args.subset_reader is set.
+    start, stop, step (int, optional): Frames to process, as in a slice. Defaults to the whole trajectory.
+    contacts (NativeContacts, optional): Native contact analysis evaluated on the same frames.
+
+    Returns:
+    dict: Centers of geometry as returned by calculate_points().
+    """
+    groups = select_groups(uni, args)
+    if args.subset_reader:
+        return calculate_points_subset(open_dcd(args.dcd), *groups, start=start, stop=stop, step=step, contacts=contacts)
+    return calculate_points(uni, *groups, start=start, stop=stop, step=step, contacts=contacts)
+
+
+def select_groups(uni, args):
+    """
+    Select the stalks and the microtubule subunits.
+
+    Parameters:
+    uni (MDAnalysis.Universe): Universe holding the topology.
+    args (argparse.Namespace): Arguments parsed by get_parser().
+
+    Returns:
+    tuple: AtomGroups (stalk1, stalk2, msu1, msu2, msu3).
+    """
+    return (
+        uni.select_atoms(args.sel_stalk1),
+        uni.select_atoms(args.sel_stalk2),
+        uni.select_atoms(args.sel_msu1),
+        uni.select_atoms(args.sel_msu2),
+        uni.select_atoms(args.sel_msu3),
+    )
+
+
+def calculate_points_block(args, frames, contacts=None):
+    """
+    Calculate the points of a block of frames in a worker process.
+    Each worker opens a reader of its own on args.dcd.
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    frames (range): Frames to process.
+    contacts (NativeContacts, optional): Native contact analysis built by the parent process.
+
+    Returns:
+    dict: Centers of geometry as returned by calculate_points().
+    """
+    uni = load_universe(args.pdb, None if args.subset_reader else args.dcd)
+    return read_points(args, uni, frames.start, frames.stop, frames.step, contacts)
+
+
+def calculate_points_parallel(args, frames, n_workers, contacts=None):
+    """
+    Calculate the points by splitting the trajectory into contiguous frame blocks over worker processes.
+    The blocks are concatenated in frame order, so the result is identical to calculate_points().
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    frames (range): Frames to process.
+    n_workers (int): Number of worker processes.
+    contacts (NativeContacts, optional): Native contact analysis evaluated on the same frames.
+
+    Returns:
+    dict: Centers of geometry as returned by calculate_points().
+    """
+    bounds = np.linspace(0, len(frames), n_workers + 1).astype(int)
+    blocks = [frames[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        blocks = list(executor.map(calculate_points_block, repeat(args), blocks, repeat(contacts)))
+    return concatenate_points(blocks)
+
+
+def calculate_points_checkpointed(args, uni, frames, checkpoint, contacts=None):
+    """
+    Calculate the points in blocks of args.block_size frames and save each block to the checkpoint
+    once it is complete. Blocks saved by an interrupted run are loaded instead of recomputed.
+    The blocks are concatenated in frame order, so the result is identical to calculate_points().
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    uni (MDAnalysis.Universe): Universe used by the serial path, see read_points().
+    frames (range): Frames to process.
+    checkpoint (Checkpoint): Checkpoint of this run.
+    contacts (NativeContacts, optional): Native contact analysis evaluated on the same frames.
+
+    Returns:
+    dict: Centers of geometry as returned by calculate_points().
+    """
+    blocks = [frames[start:stop] for start, stop in frame_blocks(len(frames), args.block_size)]
+    names = {block: f"points_{block.start:06d}_{block.stop:06d}" for block in blocks}
+    todo = [block for block in blocks if not checkpoint.has(names[block])]
+
+    if args.n_workers > 1:
+        with ProcessPoolExecutor(max_workers=args.n_workers) as executor:
+            futures = {executor.submit(calculate_points_block, args, block, contacts): block for block in todo}
+            for future in as_completed(futures):
+                checkpoint.save(names[futures[future]], future.result())
+    else:
+        for block in todo:
+            checkpoint.save(names[block], read_points(args, uni, block.start, block.stop, block.step, contacts))
 
-    # Calculate points for defining the vector
-    p1 = np.zeros((uni.trajectory.n_frames, 3))  # Top
-    p2 = np.zeros((uni.trajectory.n_frames, 3))  # Bottom
-    for ts in tqdm(uni.trajectory):
-        p1[ts.frame] = sel1.center_of_geometry()
-        p2[ts.frame] = sel2.center_of_geometry()
+    return concatenate_points([checkpoint.load(names[block]) for block in blocks])
 
+
+def concatenate_points(blocks):
+    """
+    Concatenate the points of consecutive frame blocks in frame order.
+
+    Parameters:
+    blocks (list of dict): Points of each block as returned by calculate_points().
+
+    Returns:
+    dict: Points of all the frames.
+    """
+    return {name: np.concatenate([block[name] for block in blocks]) for name in blocks[0]}
+
+
+def calculate_angles(points):
+    """
+    Calculate the spherical angles of the stalk vector in the coordinate system of the microtubule plane.
+    Each frame is independent, so the angles of a block of frames equal the corresponding part of the whole.
+
+    Parameters:
+    points (dict): Centers of geometry as returned by calculate_points().
+
+    Returns:
+    tuple: (theta, phi) arrays of shape (n_frames,).
+    """
     # Calculate direction vector
-    vectors = p2 - p1
+    vectors = points["bottom"] - points["top"]
     norms = np.linalg.norm(vectors, axis=1, keepdims=True)
     vectors /= norms
 
-    # Define plane selections
-    sel1 = msu1
-    sel2 = msu2
-    sel3 = msu3
-
-    # Calculate points for defining the plane
-    p1 = np.zeros((uni.trajectory.n_frames, 3))
-    p2 = np.zeros((uni.trajectory.n_frames, 3))
-    p3 = np.zeros((uni.trajectory.n_frames, 3))
-    for ts in tqdm(uni.trajectory):
-        p1[ts.frame] = sel1.center_of_geometry()
-        p2[ts.frame] = sel2.center_of_geometry()
-        p3[ts.frame] = sel3.center_of_geometry()
-
     # Calculate axes
-    p21 = p1 - p2
-    p23 = p3 - p2
+    p21 = points["msu1"] - points["msu2"]
+    p23 = points["msu3"] - points["msu2"]
 
     z_axes = np.cross(p23, p21)
     x_axes = np.cross(p21, z_axes)
@@ -127,28 +311,418 @@ def main():
     z_axes /= np.linalg.norm(z_axes, axis=1, keepdims=True)
 
     # Calculate angles
-    theta_list = []
-    phi_list = []
-    # for vector in vectors:
-    for vector, x_axis, y_axis, z_axis in zip(vectors, x_axes, y_axes, z_axes):
-        theta, phi = calculate_spherical_angles_rotated(vector, x_axis, y_axis, z_axis)
-        theta_list.append(theta)
-        phi_list.append(phi)
+    return calculate_spherical_angles_rotated(vectors, x_axes, y_axes, z_axes)
 
-    # Calculate contact count ratio and rmsd
-    ret = angle_vs_contacts(Path(args.dcd), Path(args.itp), Path(args.pdb), neckmimic=True if Path(args.dcd).parent.parent.name != 'kinesin-no-neckmimic' else False)
 
-    # Create dataframe
-    df = pl.DataFrame({
-        "theta": theta_list,
-        "phi": phi_list,
-        "contact_count_ratio": ret['contact_count_ratio'],
-        "rmsd": ret['rmsd'],
-    })
+class AngleUnwrapper:
+    """
+    np.unwrap for a series of angles that arrives in chunks.
+    The last raw and unwrapped values are kept, so each chunk continues the unwrapping of the previous ones.
+    """
 
+    def __init__(self, period=2 * np.pi):
+        self.period = period
+        self._last = None
+
+    def __call__(self, angles):
+        """
+        Unwrap the next chunk of angles.
+
+        Parameters:
+        angles (array-like): Raw angles in radians.
+
+        Returns:
+        numpy.ndarray: Unwrapped angles.
+        """
+        angles = np.asarray(angles, dtype=float)
+        if angles.size == 0:
+            return angles
+        if self._last is None:
+            unwrapped = np.unwrap(angles, period=self.period)
+        else:
+            raw, prev = self._last
+            unwrapped = np.unwrap(np.concatenate(([raw], angles)), period=self.period)[1:] + (prev - raw)
+        self._last = (angles[-1], unwrapped[-1])
+        return unwrapped
+
+
+def load_universe(pdb, dcd=None, topologies=None):
+    """
+    Load a trajectory onto its topology.
+
+    Parameters:
+    pdb (str): PDB file for topology.
+    dcd (str, optional): DCD file for trajectory. Without it the universe holds the PDB coordinates.
+    topologies (dict, optional): Cache of parsed topologies. When given, each PDB is parsed once
+        and the universe is reused by later calls in the same process.
+
+    Returns:
+    MDAnalysis.Universe: Universe holding the topology and the trajectory.
+    """
+    if topologies is None:
+        return mda.Universe(str(pdb)) if dcd is None else mda.Universe(str(pdb), *dcd_files(dcd))
+
+    key = (str(pdb), dcd is None)
+    if key not in topologies:
+        topologies[key] = mda.Universe(str(pdb))
+    uni = topologies[key]
+    if dcd is not None:
+        # The DCD files of a frame index are read through the ChainReader of MDAnalysis
+        files = dcd_files(dcd)
+        uni.load_new(files if len(files) > 1 else files[0])
+    return uni
+
+
+def uses_neckmimic(dcd):
+    """
+    Whether the contacts of a trajectory include the neck mimic, judged from its case directory.
+
+    Parameters:
+    dcd (str): DCD file in <case>/<sim>/.
+
+    Returns:
+    bool: False for the kinesin-no-neckmimic case.
+    """
+    return Path(dcd).parent.parent.name != 'kinesin-no-neckmimic'
+
+
+def load_native_contacts(args, topologies=None):
+    """
+    Build the native contact analysis of one trajectory from args.itp, with args.pdb as the reference structure.
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    topologies (dict, optional): Cache of parsed topologies, see load_universe().
+
+    Returns:
+    NativeContacts: Native contact analysis of the atoms selected by args.sel_contacts.
+    """
+    ref = load_universe(args.pdb, topologies=topologies)
+    neckmimic = uses_neckmimic(args.dcd) if args.neckmimic is None else args.neckmimic
+    return NativeContacts(args.itp, ref.select_atoms(args.sel_contacts), neckmimic, args.contact_ratio)
+
+
+def msm_utils_contacts(args, frames):
+    """
+    Contact columns of one trajectory from angle_vs_contacts() of msm_utils, as for the published figures.
+
+    msm_utils reads the trajectory file again by itself, so it cannot read a frame index, and it evaluates
+    all the frames, which are then cut to those of the output. --sel-contacts and --contact-ratio do not
+    apply to it.
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    frames (range): Frames of the trajectory in the output.
+
+    Returns:
+    dict: Columns of angle_vs_contacts() for the given frames.
+    """
+    from msm_utils.plot_angle_vs_native_contacts import angle_vs_contacts
+
+    if is_frame_index(args.dcd):
+        raise ValueError(f"msm_utils cannot read the frame index {args.dcd}, pass --contact-engine native.")
+    neckmimic = uses_neckmimic(args.dcd) if args.neckmimic is None else args.neckmimic
+    ret = angle_vs_contacts(Path(args.dcd), Path(args.itp), Path(args.pdb), neckmimic=neckmimic)
+    return {name: ret[name][frames.start:frames.stop:frames.step] for name in ("contact_count_ratio", "rmsd")}
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sel-stalk1", type=str, required=True, help="Selection string for the stalk 1")
+    parser.add_argument("--sel-stalk2", type=str, required=True, help="Selection string for the stalk 2")
+    parser.add_argument("--sel-msu1", type=str, required=True, help="Selection for the microtubule subunit C")
+    parser.add_argument("--sel-msu2", type=str, required=True, help="Selection for the microtubule subunit G")
+    parser.add_argument("--sel-msu3", type=str, required=True, help="Selection for the microtubule subunit L")
+    parser.add_argument("--pdb", type=str, required=True, help="PDB file for topology")
+    parser.add_argument("--dcd", type=str, required=True, help="DCD file for trajectory, a frame index of several DCD files written by step00_index_trajectory.py, or an archive written by step00_archive_trajectory.py")
+    parser.add_argument("--itp", type=str, required=True, help="ITP file for trajectory")
+    parser.add_argument("--sel-contacts", type=str, default="resid 7516-8266", help="Selection for the native contacts and the RMSD")
+    parser.add_argument("--contact-ratio", type=float, default=1.2, help="Factor on the native distance below which a native pair is formed")
+    parser.add_argument("--neckmimic", dest="neckmimic", action="store_true", default=None, help="The system has the neck mimic. Defaults to judging from the case directory")
+    parser.add_argument("--no-neckmimic", dest="neckmimic", action="store_false", default=None, help="The system has no neck mimic. Defaults to judging from the case directory")
+    parser.add_argument("--contact-engine", choices=["msm_utils", "native"], default="msm_utils", help="Engine of the contact columns: angle_vs_contacts() of msm_utils as for the published figures (default), or native_contacts.NativeContacts evaluated in the same pass as the angles, which has not been compared with msm_utils yet")
+    parser.add_argument("--out", type=str, required=True, help="Output file name")
+    parser.add_argument("--inp-dir", type=str, default=None, help="Directory of the GENESIS inputs (sim*.inp) of the trajectory, to write the stage index of the output")
+    parser.add_argument("--start", type=int, default=None, help="First frame to read")
+    parser.add_argument("--stop", type=int, default=None, help="Frame to stop before")
+    parser.add_argument("--step", type=int, default=None, help="Read every step-th frame")
+    parser.add_argument("--n-workers", type=int, default=1, help="Number of processes sharing the frames of the trajectory")
+    parser.add_argument("--subset-reader", action="store_true", help="Read only the selected atoms from a memory-mapped DCD")
+    parser.add_argument("--cache-dir", type=str, default=None, help="Directory of the output cache, disabled by default")
+    parser.add_argument("--cache-size", type=float, default=20.0, help="Size limit of the output cache in GB")
+    parser.add_argument("--checkpoint-dir", type=str, default=None, help="Directory for checkpoints that let an interrupted run resume")
+    parser.add_argument("--block-size", type=int, default=2000, help="Number of frames per checkpoint block")
+    parser.add_argument("--follow", action="store_true", help="Follow a DCD that is still being written and update the output as frames are appended")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between polls of a followed DCD")
+    parser.add_argument("--idle-timeout", type=float, default=600.0, help="Stop following once the DCD has not grown for this many seconds")
+    return parser
+
+
+def output_frame(theta, phi, ret=None):
+    """
+    CVs of the frames of one trajectory, one row per frame.
+
+    Parameters:
+    theta, phi (array-like): Spherical angles of the stalk vector.
+    ret (dict, optional): Results of NativeContacts.results() or msm_utils_contacts(). Without them only the angles are kept.
+
+    Returns:
+    polars.DataFrame: Columns of the output.
+    """
+    columns = {"theta": theta, "phi": phi}
+    if ret is not None:
+        columns["contact_count_ratio"] = ret['contact_count_ratio']
+        columns["rmsd"] = ret['rmsd']
+    return pl.DataFrame(columns)
+
+
+def write_output(args, theta, phi, ret=None, n_frames=None):
+    """
+    Save the CVs of one trajectory to args.out.
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    theta, phi (array-like): Spherical angles of the stalk vector.
+    ret (dict, optional): Results of NativeContacts.results() or msm_utils_contacts(). Without them only the angles are saved.
+    n_frames (int, optional): Number of frames of the trajectory, to split the rows by stage. Defaults to that in the DCD headers.
+    """
+    # Save dataframe with one row group per stage, replacing the file atomically
+    out = Path(args.out)
+    tmp = out.with_name(f".{out.name}.{os.getpid()}.tmp")
+    write_parquet_stages(output_frame(theta, phi, ret).to_arrow(), tmp, output_stages(args, n_frames))
+    os.replace(tmp, out)
+
+
+def output_stages(args, n_frames=None):
+    """
+    Rows of the stages in args.out from the GENESIS inputs in args.inp_dir, see stage_index.py.
+    Without --inp-dir, a frame index given as --dcd provides the stages of its DCD files.
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    n_frames (int, optional): Number of frames of the trajectory. Defaults to that in the DCD headers.
+
+    Returns:
+    dict or None: Stage name to (start, stop) rows, None without stages.
+    """
+    if args.inp_dir is None and not is_frame_index(args.dcd):
+        return None
+    reader = open_dcd(args.dcd)
+    stages = read_stages(args.inp_dir) if args.inp_dir is not None else reader.stages()
+    frames = range(reader.n_frames if n_frames is None else n_frames)[args.start:args.stop:args.step]
+    return stage_rows(stages, frames)
+
+
+def write_stages(args, n_frames=None):
+    """
+    Write the stage index of args.out, see output_stages(). Nothing is written without stages.
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    n_frames (int, optional): Number of frames of the trajectory. Defaults to that in the DCD headers.
+    """
+    rows = output_stages(args, n_frames)
+    if rows is not None:
+        write_stage_index(args.out, rows)
+
+
+def parts_dir(out):
+    """
+    Directory of the parts written by follow_cv(), e.g. trajectory.parts/ for trajectory.parquet.
+    """
+    return Path(out).with_suffix(".parts")
+
+
+def write_part(path, df):
+    """
+    Write the CVs of the frames appended since the last poll as one Parquet part, replacing the file atomically.
+
+    Parameters:
+    path (Path): Part file named after its first frame, e.g. trajectory.parts/part-000000000.parquet.
+    df (polars.DataFrame): Rows of the part, see output_frame().
+    """
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    df.write_parquet(tmp)
+    os.replace(tmp, path)
+
+
+def merge_parts(args, n_frames):
+    """
+    Merge the parts written by follow_cv() into args.out and remove them.
+    The output holds one row group per stage and its stage index, as written by write_cv().
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    n_frames (int): Number of frames in the parts.
+    """
+    parts = parts_dir(args.out)
+    df = pl.concat([pl.read_parquet(path) for path in sorted(parts.glob("part-*.parquet"))])
+    out = Path(args.out)
+    tmp = out.with_name(f".{out.name}.{os.getpid()}.tmp")
+    write_parquet_stages(df.to_arrow(), tmp, output_stages(args, n_frames))
+    os.replace(tmp, out)
+    write_stages(args, n_frames)
+    shutil.rmtree(parts)
+
+
+def follow_cv(args, topologies=None):
+    """
+    Calculate the CVs of a trajectory while GENESIS is still writing it.
+
+    The DCD is polled every args.poll_interval seconds through dcd_reader.open_dcd(). Only the frames
+    appended since the last poll are processed, and their CVs are appended to the output as one more
+    Parquet part in parts_dir(args.out). Following stops once the DCD has not grown for
+    args.idle_timeout seconds, or on an interruption, and the parts are then merged into args.out.
+    Each frame is independent, so the final output is the same as that of write_cv().
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    topologies (dict, optional): Cache of parsed topologies, see load_universe().
+    """
+    if (args.start, args.stop, args.step) != (None, None, None):
+        raise ValueError("--follow reads every frame and cannot be combined with --start, --stop or --step.")
+    if args.contact_engine != "native":
+        raise ValueError("--follow evaluates the contacts of the appended frames only, which needs --contact-engine native.")
+
+    groups = select_groups(load_universe(args.pdb, topologies=topologies), args)
+    contacts = load_native_contacts(args, topologies)
+
+    # Parts of an earlier follow that was killed before merging them belong to an older DCD
+    parts = parts_dir(args.out)
+    shutil.rmtree(parts, ignore_errors=True)
+    parts.mkdir(parents=True)
+
+    # The angles on the status line are unwrapped across polls, so that a turn of the stalk shows as a jump rather than a wrap
+    unwrap_theta, unwrap_phi = AngleUnwrapper(), AngleUnwrapper()
+    reader = None
+    n_frames = 0
+    last_growth = time.monotonic()
+    try:
+        while True:
+            # Open the DCD once its header is written, then map the appended frames.
+            # A DCD that is missing or still being created (e.g. the next file of a frame index) is retried at the next poll
+            try:
+                if reader is None:
+                    reader = open_dcd(args.dcd)
+                else:
+                    reader.refresh()
+            except (FileNotFoundError, ValueError, IndexError):
+                pass
+
+            if reader is not None and reader.n_frames > n_frames:
+                points = calculate_points_subset(reader, *groups, start=n_frames, stop=reader.n_frames, contacts=contacts)
+                theta, phi = calculate_angles(points)
+                ret = contacts.results(points)
+                write_part(parts / f"part-{n_frames:09d}.parquet", output_frame(theta, phi, ret))
+                n_frames = reader.n_frames
+                print(f"{args.out}: {n_frames} frames, unwrapped theta {unwrap_theta(theta)[-1]:.3f}, phi {unwrap_phi(phi)[-1]:.3f}, "
+                      f"contact ratio {ret['contact_count_ratio'][-1]:.3f}")
+                last_growth = time.monotonic()
+            elif time.monotonic() - last_growth > args.idle_timeout:
+                break
+            time.sleep(args.poll_interval)
+    finally:
+        if n_frames > 0:
+            merge_parts(args, n_frames)
+        else:
+            shutil.rmtree(parts, ignore_errors=True)
+
+    if n_frames == 0:
+        raise TimeoutError(f"No frames of {args.dcd} appeared within {args.idle_timeout} s.")
+
+
+def write_cv(args, topologies=None, checkpoint=None):
+    """
+    Calculate the CVs of one trajectory and save them to args.out.
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    topologies (dict, optional): Cache of parsed topologies, see load_universe().
+    checkpoint (Checkpoint, optional): Checkpoint to save partial results to and resume from.
+    """
+    # Load data
+    uni = load_universe(args.pdb, None if args.subset_reader else args.dcd, topologies)
+    n_frames = open_dcd(args.dcd).n_frames if args.subset_reader else uni.trajectory.n_frames
+    frames = range(n_frames)[args.start:args.stop:args.step]
+    contacts = load_native_contacts(args, topologies) if args.contact_engine == "native" else None
+
+    # msm_utils reads the trajectory by itself, before the pass so that an input it cannot read fails early
+    ret = msm_utils_contacts(args, frames) if contacts is None else None
+
+    # Calculate points for defining the vector and the plane, and the native contacts in the same pass
+    if checkpoint is not None:
+        points = calculate_points_checkpointed(args, uni, frames, checkpoint, contacts)
+    elif args.n_workers > 1:
+        points = calculate_points_parallel(args, frames, args.n_workers, contacts)
+    else:
+        points = read_points(args, uni, args.start, args.stop, args.step, contacts)
+
+    # Calculate angles
+    theta_list, phi_list = calculate_angles(points)
+
+    # Calculate contact count ratio and rmsd
+    if contacts is not None:
+        ret = contacts.results(points)
 
     # Save dataframe
-    df.write_parquet(args.out)
+    write_output(args, theta_list, phi_list, ret, n_frames)
+
+
+def cache_key(args):
+    """
+    Key of the output of one trajectory, see cv_cache.content_key().
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+
+    Returns:
+    str: Hexadecimal key.
+    """
+    files = [*dcd_files(args.dcd), args.pdb, args.itp]
+    options = dict(key_options(args), neckmimic=uses_neckmimic(args.dcd) if args.neckmimic is None else args.neckmimic)
+    # The modules reading the frames and writing the output change its bytes as well
+    sources = [__file__, *(inspect.getsourcefile(code) for code in (NativeContacts, open_dcd, mda_archive, write_parquet_stages))]
+    return content_key(files, options, sources)
+
+
+def run(args, topologies=None):
+    """
+    Calculate the CVs of one trajectory and save them to args.out.
+    With --cache-dir, an output computed earlier from the same inputs, options and script is copied instead.
+    With --checkpoint-dir, partial results are kept until the output is written, so that a rerun resumes.
+    With --follow, a trajectory that is still being written is followed, see follow_cv().
+
+    Parameters:
+    args (argparse.Namespace): Arguments parsed by get_parser().
+    topologies (dict, optional): Cache of parsed topologies, see load_universe().
+    """
+    if args.follow:
+        follow_cv(args, topologies)
+        return
+
+    key = cache_key(args) if args.cache_dir or args.checkpoint_dir else None
+
+    cache = None
+    if args.cache_dir is not None:
+        cache = CVCache(args.cache_dir, args.cache_size)
+        if cache.fetch(key, args.out):
+            print(f"{args.out}: restored from cache")
+            write_stages(args)
+            return
+
+    checkpoint = Checkpoint(Path(args.checkpoint_dir) / key) if args.checkpoint_dir else None
+    write_cv(args, topologies, checkpoint)
+    write_stages(args)
+
+    if cache is not None:
+        cache.store(key, args.out)
+    if checkpoint is not None:
+        checkpoint.remove()
+
+
+def main():
+    args = get_parser().parse_args()
+    run(args)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 import argparse
-import pathlib
 import warnings
 import seaborn as sns
 
@@ -14,7 +13,9 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import pickle
-from pathlib import Path
+from cv_ensemble import load_ensemble
+from cv_transitions import classify_paths, first_above, gather_windows, unwrap_frames
+from time_histogram import shared_bin_edges, time_histogram
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -22,32 +23,22 @@ import matplotlib.pyplot as plt
 import numpy as np
 import matplotlib.pyplot as plt
 
-def plot_data_distribution_histogram_with_overlay(x, y, z, save_path, bins=10, previous_steps=20):
+def plot_data_distribution_histogram_with_overlay(x, y, z, save_path, bins=10, previous_steps=20, weights=None):
     """
     x: shape (41, 79) の NumPy 配列 (時系列データ)
     y, z: shape (2000,) の NumPy 配列（比較用のデータ）
     save_path: プロット画像の保存先
     bins: ヒストグラムのビン数
     previous_steps: 0 とするタイムステップの位置
+    weights: x の各値の重み（x と同じ shape、または各トラジェクトリの重み (N,)）。Noneなら個数を数える
     """
 
-    # データ全体の最小・最大値を求める（x, y, z を統一したスケールで扱う）
-    global_min = min(x.min(), y.min(), z.min())
-    global_max = max(x.max(), y.max(), z.max())
-    adjuster = (global_max - global_min) / bins / 2
+    # ヒストグラムのビンを統一（x, y, z を統一したスケールで扱う）
+    bin_edges = shared_bin_edges(x, y, z, bins=bins)
+    adjuster = (bin_edges[-1] - bin_edges[0]) / bins / 2
 
-    # ヒストグラムのビンを統一
-    bin_edges = np.linspace(global_min, global_max, bins + 1)
-
-    # x の時間変化ヒストグラムを計算
-    hist_list = []
-    peak_values = []
-    for i in range(x.shape[0]):
-        hist, _ = np.histogram(x[i, :], bins=bin_edges)
-        hist_list.append(hist)
-        peak_values.append(bin_edges[np.argmax(hist)])  # 各タイムステップの最頻値
-
-    hist_array = np.array(hist_list)
+    # x の時間変化ヒストグラムと各タイムステップの最頻値を一度に計算
+    hist_array, peak_values = time_histogram(x, bin_edges, weights)
 
     # y, z の標準偏差を計算し、平均 ± 1std の範囲をバンドとして表示
     y_mean, y_std = np.mean(y), np.std(y)
@@ -71,7 +62,6 @@ def plot_data_distribution_histogram_with_overlay(x, y, z, save_path, bins=10, p
     ax.fill_betweenx(time_steps, z_mean - z_std + adjuster, z_mean + z_std + adjuster, color='blue', alpha=0.2, label='AlF3 State ±1 std')
 
     # 各タイムステップの最頻値を点で表示（カウントダウン方向に修正）
-    peak_values = np.array(peak_values)
     #ax.scatter(peak_values[::-1]+adjuster, time_steps, color='black', s=1, marker='o', label='Mode of Distribution')
 
     # 軸ラベル設定
@@ -94,7 +84,7 @@ def plot_data_distribution_histogram_with_overlay(x, y, z, save_path, bins=10, p
     plt.savefig(save_path, bbox_inches='tight', format='pdf')
     plt.show()
 
-def save_histogram_data(x, output_csv_path, bins=10, previous_steps=20):
+def save_histogram_data(x, output_csv_path, bins=10, previous_steps=20, bin_edges=None, weights=None):
     """
     入力データ x の各時点におけるヒストグラムを計算し、time_steps および hist_array をCSVに保存する。
 
@@ -103,19 +93,16 @@ def save_histogram_data(x, output_csv_path, bins=10, previous_steps=20):
         output_csv_path (str or Path): 保存先のCSVファイルパス
         bins (int): ヒストグラムのビン数
         previous_steps (int): 時系列のオフセット（time_stepsを -previous_steps 起点に調整）
+        bin_edges (ndarray): 他のデータと共通のビン（shared_bin_edges()）。Noneなら x の範囲で bins 個に分ける
+        weights (ndarray): x の各値の重み。Noneなら個数を数える
     """
     # ビンの範囲を設定
-    global_min = np.min(x)
-    global_max = np.max(x)
-    bin_edges = np.linspace(global_min, global_max, bins + 1)
+    if bin_edges is None:
+      bin_edges = shared_bin_edges(x, bins=bins)
+    bins = len(bin_edges) - 1
 
-    # 各タイムステップごとのヒストグラム
-    hist_list = []
-    for i in range(x.shape[0]):
-        hist, _ = np.histogram(x[i, :], bins=bin_edges)
-        hist_list.append(hist)
-
-    hist_array = np.array(hist_list)  # shape: (time, bins)
+    # 各タイムステップごとのヒストグラムを一度に計算
+    hist_array, _ = time_histogram(x, bin_edges, weights)  # shape: (time, bins)
 
     # time_steps: 小数点表記で -previous_steps から始まる逆順
     time_steps = np.arange(-previous_steps + x.shape[0] - 1, -previous_steps - 1, -1) / 100
@@ -127,129 +114,43 @@ def save_histogram_data(x, output_csv_path, bins=10, previous_steps=20):
     # 保存
     df.to_csv(output_csv_path, index=False, encoding='utf-8-sig')
 
-def unwrap_angles(df):
-    """
-    データフレーム内の 'theta' 列と 'phi' 列に np.unwrap を適用し、
-    修正後のデータフレームを返す関数。
-
-    Parameters:
-        df (pd.DataFrame): thetaとphi列を含むデータフレーム。
-
-    Returns:
-        pd.DataFrame: np.unwrap処理後のデータフレーム。
-    """
-    # データフレームのコピーを作成
-    df_unwrapped = df.copy()
-
-    # np.unwrap処理をtheta列とphi列に適用
-    df_unwrapped['theta'] = np.unwrap(df_unwrapped['theta'].values, period=2 * np.pi)
-    df_unwrapped['phi'] = np.unwrap(df_unwrapped['phi'].values, period=2 * np.pi)
-
-    return df_unwrapped
-
-def extract_transition(df):
-  if df['phi'].min() < 0: #1度でもpath2の方向に進んだらはじく
-    return None, "path2"
-
-  last_phi = df['phi'].iloc[-1]
-  if last_phi > 0:
-    # 条件を満たす最初の行のインデックスを取得
-    idx = (df['phi'] > 2).idxmax()
-  
-    # その行までのデータを取得
-    df_subset = df.copy()
-    return df_subset, 'path1'
-  elif last_phi < -1:
-    # 条件を満たす最初の行のインデックスを取得
-    idx = (df['phi'] < -4).idxmax()
-  
-    # その行までのデータを取得
-    df_subset = df.copy()
-    return df_subset, 'path2'
-  else:
-    raise RuntimeError
-    
-
-def extract_transition2(df, previous_steps=20, post_steps=20):
-  """
-  idxがneckmimic結合のタイミングに該当する。neckmimic結合の前後20stepを取る場合、
-    previous_steps=20
-    post_steps=20
-  とする
-  """
-  if df['phi'].min() < 0: #1度でもpath2の方向に進んだらはじく
-    return None, "path2"
-
-  last_phi = df['phi'].iloc[-1]
-  if last_phi > 0:
-    # 条件を満たす最初の行のインデックスを取得
-    idx = (df['contact_count_ratio'] > 0.99).idxmax()
-  
-    # その行までのデータを取得
-    df_subset = df.loc[idx-previous_steps:idx+post_steps]
-    if len(df_subset) != (previous_steps + post_steps + 1):
-      return None, "path2"
-    return df_subset, 'path1'
-  elif last_phi < -1:
-    # 条件を満たす最初の行のインデックスを取得
-    idx = (df['contact_count_ratio'] > 0.99).idxmax()
-  
-    # その行までのデータを取得
-    df_subset = df.loc[:idx]
-    return df_subset, 'path2'
-  else:
-    raise RuntimeError
-
-
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--dir", type=str, required=True, help="Directory containing CVs in parquet format")
     parser.add_argument("--out", type=str, required=True, help="Output file name")
     parser.add_argument("--raw-data", type=str, required=True, help="Raw Data file name")
+    parser.add_argument("--dataset", type=str, required=False, help="Dataset written by step01_build_dataset.py. --dir then names a case in it")
     parser.add_argument("--target", type=int, required=False, help="Target simulation number")
+    parser.add_argument("--previous-steps", type=int, default=50, help="Number of frames of the window before the docking of the neck mimic")
+    parser.add_argument("--post-steps", type=int, default=250, help="Number of frames of the window after the docking of the neck mimic")
+    parser.add_argument("--cache-dir", type=str, required=False, help="Directory of the ensemble cache, disabled by default")
+    parser.add_argument("--n-workers", type=int, required=False, help="Number of threads reading the CV files, see cv_dataset.read_cv_files()")
+    parser.add_argument("--verbose", action="store_true", help="Print the time spent reading each CV file")
     args = parser.parse_args()
 
-    # List all the parquet files
-    paths = [str(file) for file in pathlib.Path(args.dir).rglob("*.parquet")]
-    paths = sorted(paths)
+    # List all the parquet files, or the trajectories of the case in the dataset, with the rows of the sim3 stage only
+    ensemble = load_ensemble(args.dir, "*.parquet", ["theta", "phi", "contact_count_ratio"], args.dataset, stage="sim3", cache_dir=args.cache_dir, n_workers=args.n_workers, verbose=args.verbose)
 
     # Specify target path is args.target is defined
-    paths = paths if args.target is None else paths[args.target-1:args.target]
-
-    # Load dataframes
-    df_list = []
-    indexs = []
-    for path in paths:
-        df = pd.read_parquet(path)
-
-        # Split trajectory
-        sim1 = df.iloc[:2000]
-        sim2 = df.iloc[2000:2300]
-        sim3 = df.iloc[2300:22300]
-        sim4 = df.iloc[22300:22600]
-        sim5 = df.iloc[22600:42600]
-
-
-        # Unwrap angles
-        df = unwrap_angles(sim3)
-
-        # Extract only transition part
-        df, pth = extract_transition2(df, previous_steps=50, post_steps=250)
-        if pth == 'path1':
-          df = df.reset_index()
-          df_list.append(df)
+    if args.target is not None:
+      ensemble = ensemble.select(np.arange(len(ensemble)) == args.target-1)
 
-        #  phis.append(df['phi'].to_list()[:1000])
+    # Unwrap angles of all the seeds at once
+    phi = unwrap_frames(ensemble.cv('phi'))
 
-    mean_df = pd.concat(df_list).groupby(level=0).mean()
-    phis = np.array([df['phi'].values for df in df_list])
+    # Extract only transition part: --previous-steps (50) steps before to --post-steps (250) steps after the first frame with contact_count_ratio > 0.99
+    rows = first_above(ensemble.cv('contact_count_ratio'), 0.99)
+    windows, valid = gather_windows(phi, rows, args.previous_steps, args.post_steps, ensemble.lengths)
+    # 窓が途中で切れるトラジェクトリは除外する
+    path1 = (classify_paths(phi, ensemble.lengths) == 'path1') & valid
+    phis = windows[path1]
 
     free = pd.read_csv("../analysis-04/step02_plot_distributions.out/free.csv")
     alf3 = pd.read_csv("../analysis-04/step02_plot_distributions.out/alf3.csv")
     free = free[(free['phi'] > phis.min()) & (free['phi'] < phis.max())]
     alf3 = alf3[(alf3['phi'] > phis.min()) & (alf3['phi'] < phis.max())]
 
-    plot_data_distribution_histogram_with_overlay(phis.T, free["phi"].to_numpy(), alf3["phi"].to_numpy(), args.out, bins=30, previous_steps=50)
+    plot_data_distribution_histogram_with_overlay(phis.T, free["phi"].to_numpy(), alf3["phi"].to_numpy(), args.out, bins=30, previous_steps=args.previous_steps)
 
 if __name__ == "__main__":
     main()
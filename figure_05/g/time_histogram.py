@@ -0,0 +1,95 @@
+import numpy as np
+
+
+def shared_bin_edges(*arrays, bins=10):
+    """
+    Evenly spaced bin edges over the range of several datasets, so that their histograms share bins.
+
+    Parameters:
+    arrays (array-like): Datasets of any shape. NaN values are ignored.
+    bins (int): Number of bins.
+
+    Returns:
+    numpy.ndarray: bins + 1 edges from the smallest to the largest value, or around the value if all are equal.
+    """
+    low = min(np.nanmin(array) for array in arrays)
+    high = max(np.nanmax(array) for array in arrays)
+    if low == high:
+        # Widened around a single value as numpy.histogram() does
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+def _bin_index(x, bin_edges, uniform):
+    """
+    Bin of each value as numpy.histogram(), with n_bins for the values outside the edges and NaN values.
+    """
+    n_bins = len(bin_edges) - 1
+    if uniform:
+        first, last = bin_edges[0], bin_edges[-1]
+        # Index from the position within the range, clipped for the values outside the edges and NaN values
+        with np.errstate(invalid="ignore"):
+            index = ((x - first) * (n_bins / (last - first))).astype(np.intp)
+        np.clip(index, 0, n_bins - 1, out=index)
+        # Corrected by the edges themselves against round-off. The last bin is closed on the right.
+        upper = np.append(bin_edges[1:-1], np.nextafter(last, np.inf))
+        index -= x < bin_edges[index]
+        index += x >= upper[index]
+        inside = (x >= first) & (x <= last)
+    else:
+        index = np.searchsorted(bin_edges, x, side="right") - 1
+        # The right edge belongs to the last bin
+        index[x == bin_edges[-1]] = n_bins - 1
+        inside = (index >= 0) & (index < n_bins)
+    index[~inside] = n_bins
+    return index
+
+
+def time_histogram(x, bin_edges, weights=None, chunk_size=2**16):
+    """
+    Histogram of each timestep of a time series ensemble, as numpy.histogram() on each row, in one pass.
+
+    The bins of all the values of a chunk of timesteps are found at once, arithmetically for evenly spaced
+    edges as numpy.histogram() does, and their counts are accumulated by a single bincount() over
+    (timestep, bin) pairs, without a Python loop over the timesteps. The bins are those of
+    numpy.histogram(): each is closed on the left and the last one on the right too. Values outside the
+    edges and NaN values are not counted. This saves the per-call overhead of numpy.histogram(), so it
+    is several times faster for many timesteps of a few hundred samples, e.g. windows over the seeds,
+    but on par with a loop for timesteps of thousands of samples. The chunks of about chunk_size values
+    bound the temporary arrays, so long windows take no extra memory.
+
+    Parameters:
+    x (array-like): Values of shape (n_timesteps, n_samples).
+    bin_edges (array-like): Increasing bin edges, e.g. from shared_bin_edges().
+    weights (array-like, optional): Weight of each value, of the shape of x or broadcastable to it,
+        e.g. (n_samples,) for one weight per trajectory. Defaults to counting each value once.
+    chunk_size (int): Number of values binned at once, at least one timestep.
+
+    Returns:
+    tuple: (counts, modes) where
+        - counts is of shape (n_timesteps, n_bins), integers without weights and sums of the weights with them.
+        - modes is the left edge of the most populated bin of each timestep, as bin_edges[argmax(counts)].
+    """
+    x = np.asarray(x, dtype=np.float64)
+    bin_edges = np.asarray(bin_edges, dtype=np.float64)
+    n_timesteps, n_samples = x.shape
+    n_bins = len(bin_edges) - 1
+    if weights is not None:
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), x.shape)
+    widths = np.diff(bin_edges)
+    # Edges of zero width, e.g. around a single value, are searched
+    uniform = widths[0] > 0 and np.allclose(widths, widths[0])
+
+    # One extra column per timestep collects the values outside the edges, and is dropped at the end
+    counts = np.zeros((n_timesteps, n_bins + 1), dtype=np.int64 if weights is None else np.float64)
+    step = max(1, chunk_size // max(n_samples, 1))
+    for start in range(0, n_timesteps, step):
+        block = x[start:start + step]
+        index = _bin_index(block, bin_edges, uniform)
+        index += np.arange(len(block))[:, np.newaxis] * (n_bins + 1)
+        block_weights = None if weights is None else weights[start:start + step].ravel()
+        counts[start:start + len(block)] = np.bincount(index.ravel(), weights=block_weights, minlength=len(block) * (n_bins + 1)).reshape(len(block), n_bins + 1)
+    counts = counts[:, :n_bins]
+
+    modes = bin_edges[counts.argmax(axis=1)]
+    return counts, modes